@@ -0,0 +1,155 @@
+"""
+Concurrent evaluation of models backed by external simulators.
+
+Such models spend seconds blocked on a subprocess per design, so
+evaluating independent designs one after another leaves the machine
+idle. Here a model only has to provide ``evaluate(x)`` returning a mapping
+of each dependent name to its value at design x, without keeping any
+state between calls. It may be a coroutine (``async def evaluate(x)``),
+which is awaited directly, or a plain blocking function, which is run in a
+thread pool of bounded size. :py:class:`ConcurrentModel` then evaluates
+batches of designs concurrently.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+
+class ConcurrentModel(object):
+    """
+    Adapter that runs independent evaluations of a model concurrently.
+
+    At most ``max_concurrency`` evaluations run at once, and each one is
+    abandoned ``timeout`` seconds after it starts (None waits forever).
+    Blocking calls run in a pool of ``max_concurrency`` threads, shared by
+    all batches. A call that timed out keeps its thread until it returns,
+    so later calls may wait for a free thread, but their timeout only
+    starts once they run.
+
+    The adapter provides ``evaluate_many(designs)`` as used by
+    :py:func:`physprog.objective.build_batch_objective`, so a whole batch
+    of candidates is evaluated concurrently. It also follows the usual
+    one-design model protocol with a ``design`` attribute, an
+    ``evaluate(x)`` method and one method per dependent name. Designs
+    that fail or time out are invalid. Their dependent methods raise
+    ValueError, and their values from ``evaluate_many`` are NaN.
+    """
+
+    def __init__(self, model, names, max_concurrency=4, timeout=None):
+        """Wrap model, whose evaluations give the dependents in names."""
+        self.model = model
+        self.names = list(names)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._design = None
+        self._result = None
+        self._executor = None
+
+    @property
+    def design(self):
+        """Return the current design."""
+        return self._design
+
+    @design.setter
+    def design(self, val):
+        self._design = val
+        self._result = None
+
+    def evaluate(self, x=None):
+        """Evaluate the current design, returning dependents in order."""
+        if x is not None:
+            self.design = x
+        if self._result is None:
+            self._result, = self._run([self._design])
+        if isinstance(self._result, Exception):
+            return [np.nan for _name in self.names]
+        return [self._result[name] for name in self.names]
+
+    def evaluate_many(self, designs):
+        """Evaluate designs concurrently into arrays of each dependent."""
+        results = self._run(designs)
+        return self._collect(results)
+
+    async def evaluate_many_async(self, designs):
+        """Evaluate designs concurrently from within a running event loop."""
+        results = await self._gather(designs)
+        return self._collect(results)
+
+    def __getattr__(self, name):
+        """Look up dependents of the current design."""
+        if name in self.__dict__.get('names', ()):
+            return lambda: self._value(name)
+        raise AttributeError(name)
+
+    def _value(self, name):
+        """Return a dependent of the current design."""
+        if self._result is None:
+            self.evaluate()
+        if isinstance(self._result, Exception):
+            raise ValueError('Design {} could not be evaluated: {!r}'
+                             ''.format(self._design, self._result))
+        return self._result[name]
+
+    def _collect(self, results):
+        """Convert per-design results into arrays of each dependent."""
+        dependents = {name: np.full(len(results), np.nan)
+                      for name in self.names}
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                continue
+            for name in self.names:
+                dependents[name][i] = result[name]
+        return dependents
+
+    def _run(self, designs):
+        """Evaluate designs concurrently in a fresh event loop."""
+        return asyncio.run(self._gather(designs))
+
+    async def _gather(self, designs):
+        """Evaluate designs, returning a mapping or exception for each."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *[self._evaluate_one(x, semaphore) for x in designs],
+            return_exceptions=True)
+        for x, result in zip(designs, results):
+            if isinstance(result, Exception):
+                LOG.warning('Evaluation of design %s failed: %r', x, result)
+        return results
+
+    async def _evaluate_one(self, x, semaphore):
+        """Evaluate one design once a concurrency slot is free."""
+        x = np.array(x, dtype=float)
+        async with semaphore:
+            if asyncio.iscoroutinefunction(self.model.evaluate):
+                return await asyncio.wait_for(self.model.evaluate(x),
+                                              self.timeout)
+            loop = asyncio.get_running_loop()
+            started = loop.create_future()
+
+            def evaluate():
+                """Signal the start of the call, then make it."""
+                loop.call_soon_threadsafe(_set_done, started)
+                return self.model.evaluate(x)
+
+            call = asyncio.wrap_future(self._threads().submit(evaluate))
+            # threads may still be busy with calls that timed out
+            await started
+            return await asyncio.wait_for(call, self.timeout)
+
+    def _threads(self):
+        """Return the thread pool for blocking calls, starting it once."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.max_concurrency)
+        return self._executor
+
+
+def _set_done(future):
+    """Mark a future done unless it was cancelled meanwhile."""
+    if not future.done():
+        future.set_result(None)
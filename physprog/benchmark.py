@@ -0,0 +1,312 @@
+"""
+Reproducible performance benchmarks.
+
+Run all benchmarks and write the results as JSON with::
+
+    python -m physprog.benchmark --output results.json
+
+Each benchmark returns a list of records (dicts) with a ``name``, the
+parameters it ran with and its measurements, so runs on different
+commits or machines can be compared directly. Random inputs are seeded.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import platform
+import sys
+import time
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import codegen
+from physprog import instrument
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(func):
+    """Register a benchmark function under its name."""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def best_time(func, repeat=3):
+    """Return the fastest of several timings of func in seconds."""
+    times = []
+    for _i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def random_preferences(nsoft, seed=0):
+    """Make unbuilt soft class functions with random region widths."""
+    rng = np.random.RandomState(seed)
+    funcs = collections.OrderedDict()
+    for i in range(nsoft):
+        edges = np.cumsum(rng.lognormal(0, 1.5, 5)).tolist()
+        if i % 2:
+            funcs['dependent{}'.format(i)] = classfunctions.SmallerBetter(
+                classfunctions.SoftBounds(*edges))
+        else:
+            funcs['dependent{}'.format(i)] = classfunctions.LargerBetter(
+                classfunctions.SoftBounds(*[-edge for edge in edges]))
+    return funcs
+
+
+@benchmark
+def classfunction_evaluation(nvalues=100000, quick=False):
+    """Throughput of scalar and batch class function evaluation."""
+    if quick:
+        nvalues = 1000
+    func = classfunctions.SmallerBetter(
+        classfunctions.SoftBounds(10, 20, 30, 40, 50))
+    func.build_splines(6)
+    values = np.random.RandomState(0).uniform(0, 60, nvalues)
+    scalar_values = values.tolist()
+
+    scalar = best_time(lambda: [func.evaluate(g) for g in scalar_values])
+    batch = best_time(lambda: func.evaluate_many(values))
+    return [
+        {'name': 'classfunction_evaluation', 'mode': 'scalar',
+         'values': nvalues, 'seconds': scalar,
+         'values_per_second': nvalues / scalar},
+        {'name': 'classfunction_evaluation', 'mode': 'batch',
+         'values': nvalues, 'seconds': batch,
+         'values_per_second': nvalues / batch},
+    ]
+
+
+@benchmark
+def spline_build(sizes=(6, 10, 30, 100, 300, 1000), quick=False):
+    """Time to build all splines as the number of soft dependents grows."""
+    if quick:
+        sizes = sizes[:2]
+    records = []
+    for nsoft in sizes:
+        funcs = list(random_preferences(nsoft).values())
+        seconds = best_time(lambda: classfunctions.build_all_splines(funcs))  # pylint: disable=cell-var-from-loop
+        records.append({
+            'name': 'spline_build', 'dependents': nsoft, 'seconds': seconds,
+            'beta': float(funcs[0].beta),
+            'trials': sum(func.trials for func in funcs)})
+    return records
+
+
+@benchmark
+def preference_set(sizes=(10, 100, 500), ndesigns=1000, quick=False):
+    """Per-function dispatch against a compiled preference set."""
+    if quick:
+        sizes = sizes[:1]
+        ndesigns = 10
+    records = []
+    for nsoft in sizes:
+        prefs = random_preferences(nsoft)
+        classfunctions.build_all_splines(list(prefs.values()))
+        compiled = classfunctions.PreferenceSet(prefs)
+        rng = np.random.RandomState(0)
+        # values spread across the tolerable and undesirable regions
+        values = compiled.bounds[:, 2] + rng.uniform(
+            0, 1, (ndesigns, nsoft)) * (compiled.bounds[:, 3] -
+                                        compiled.bounds[:, 2])
+        funcs = list(prefs.values())
+        row = values[0].tolist()
+
+        def dispatch():
+            """Evaluate one design a class function at a time."""
+            total = 0.0
+            for func, g in zip(funcs, row):  # pylint: disable=cell-var-from-loop
+                total += func.evaluate(g)
+            return total
+
+        records.append({
+            'name': 'preference_set', 'dependents': nsoft, 'designs': 1,
+            'dispatch_seconds': best_time(dispatch),
+            'compiled_seconds': best_time(
+                lambda: compiled.evaluate(row))})  # pylint: disable=cell-var-from-loop
+        records.append({
+            'name': 'preference_set', 'dependents': nsoft,
+            'designs': ndesigns,
+            'dispatch_seconds': best_time(
+                lambda: [func.evaluate_many(values[:, j])  # pylint: disable=cell-var-from-loop
+                         for j, func in enumerate(funcs)]),  # pylint: disable=cell-var-from-loop
+            'compiled_seconds': best_time(
+                lambda: compiled.evaluate(values))})  # pylint: disable=cell-var-from-loop
+    return records
+
+
+@benchmark
+def generated_aggregate(sizes=(10, 100, 500), quick=False):
+    """Generic class function loop against a generated aggregate."""
+    if quick:
+        sizes = sizes[:1]
+    records = []
+    for nsoft in sizes:
+        prefs = random_preferences(nsoft)
+        classfunctions.build_all_splines(list(prefs.values()))
+        bounds = np.array([func.bounds for func in prefs.values()])
+        # values spread across the tolerable and undesirable regions
+        row = (bounds[:, 2] + np.random.RandomState(0).uniform(0, 1, nsoft) *
+               (bounds[:, 3] - bounds[:, 2])).tolist()
+        funcs = list(prefs.values())
+        start = time.perf_counter()
+        aggregate = codegen.compile_aggregate(prefs)
+        compile_seconds = time.perf_counter() - start
+
+        def generic():
+            """Sum the class functions as build_objective does."""
+            total = 0.0
+            for func, g in zip(funcs, row):  # pylint: disable=cell-var-from-loop
+                total += func.evaluate(g)
+            return total
+
+        records.append({
+            'name': 'generated_aggregate', 'dependents': nsoft,
+            'compile_seconds': compile_seconds,
+            'generic_seconds': best_time(generic),
+            'generated_seconds': best_time(
+                lambda: aggregate(row))})  # pylint: disable=cell-var-from-loop
+    return records
+
+
+@benchmark
+def array_protocol(ndesigns=1000, quick=False):
+    """Per-call objective time of per-dependent methods against one array."""
+    # imported here since the sample problem lives with the tests.
+    # pylint: disable=import-outside-toplevel
+    from physprog import objective
+    from physprog.tests.test_objective import ArrayBeam, sample_designs
+    from physprog.tests.test_sample_problem import (SampleProblemBeam,
+                                                     SAMPLE_INPUT)
+
+    if quick:
+        ndesigns = 20
+    prefs = classfunctions.from_input(SAMPLE_INPUT)
+    designs = sample_designs(ndesigns)
+    records = []
+    for beam in (SampleProblemBeam(), ArrayBeam()):
+        aggregate = objective.build_objective(beam, prefs)
+        seconds = best_time(lambda: [aggregate(x) for x in designs])  # pylint: disable=cell-var-from-loop
+        records.append({
+            'name': 'array_protocol', 'model': type(beam).__name__,
+            'designs': ndesigns, 'seconds': seconds,
+            'seconds_per_call': seconds / ndesigns})
+    return records
+
+
+@benchmark
+def distributed_evaluation(workers=(1, 2, 4), batchsizes=(1, 16, 64),
+                           ndesigns=1024, quick=False):
+    """Latency and throughput of evaluations on local distributed workers."""
+    # imported here since the sample problem lives with the tests.
+    # pylint: disable=import-outside-toplevel
+    from physprog import distributed
+    from physprog.tests.test_sample_problem import (SampleProblemBeam,
+                                                     SAMPLE_INPUT)
+
+    if quick:
+        workers, batchsizes, ndesigns = workers[:1], batchsizes[-1:], 16
+    names = list(classfunctions.from_input(SAMPLE_INPUT))
+    beam = SampleProblemBeam()
+    designs = np.array(beam.design) * np.random.RandomState(0).uniform(
+        0.95, 1.05, (ndesigns, len(beam.design)))
+    records = []
+    for nworkers in workers:
+        with distributed.DistributedModel(names, beam.design) as model:
+            model.spawn_workers(beam, nworkers)
+            model.evaluate_many(designs[:nworkers])  # wait for the workers
+            latencies = []
+            for x in designs[:min(ndesigns, 100)]:
+                start = time.perf_counter()
+                model.evaluate(x)
+                latencies.append(time.perf_counter() - start)
+            for batchsize in batchsizes:
+                model.batchsize = batchsize
+                seconds = best_time(
+                    lambda: model.evaluate_many(designs))  # pylint: disable=cell-var-from-loop
+                records.append({
+                    'name': 'distributed_evaluation', 'workers': nworkers,
+                    'batchsize': batchsize, 'designs': ndesigns,
+                    'seconds': seconds,
+                    'designs_per_second': ndesigns / seconds,
+                    'median_latency_seconds': float(np.median(latencies))})
+    return records
+
+
+@benchmark
+def sample_optimization(quick=False):  # pylint: disable=unused-argument
+    """End-to-end optimization of the sample beam problem."""
+    # imported here since the sample problem lives with the tests.
+    # pylint: disable=import-outside-toplevel
+    from physprog import optimize
+    from physprog.tests.test_objective import ArrayBeam
+    from physprog.tests.test_sample_problem import SAMPLE_INPUT
+
+    prefs = classfunctions.from_input(SAMPLE_INPUT)
+    records = []
+    for cache in (False, True):
+        counters = instrument.Instrumentation(logger=None)
+        # every constraint of an array model runs it unless cached
+        beam = ArrayBeam()
+        start = time.perf_counter()
+        result = optimize.optimize(beam, prefs, cache=cache,
+                                   instrument=counters)
+        seconds = time.perf_counter() - start
+        records.append({
+            'name': 'sample_optimization', 'cache': cache,
+            'seconds': seconds, 'iterations': int(result.nit),
+            'value': float(result.fun),
+            'model_runs': counters.counts['model'],
+            'objective_calls': counters.counts['objective'],
+            'constraint_calls': counters.counts['constraint'],
+            'times': dict(counters.times)})
+    return records
+
+
+def run(names=None, quick=False):
+    """Run the named benchmarks (all by default) and collect results."""
+    names = list(BENCHMARKS) if names is None else names
+    results = []
+    for name in names:
+        logging.getLogger(__name__).info('Running %s', name)
+        results.extend(BENCHMARKS[name](quick=quick))
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    """Run benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run (default: all of {})'
+                        ''.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--output', '-o', help='JSON file (default: stdout)')
+    parser.add_argument('--quick', action='store_true',
+                        help='use small sizes, e.g. for smoke tests')
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(unknown)))
+
+    report = run(args.names or None, args.quick)
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
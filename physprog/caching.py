@@ -0,0 +1,130 @@
+"""
+Memoization of expensive model evaluations.
+
+Within one optimizer iteration the objective and every constraint
+ask the model for dependent values at the same design. Wrapping the
+model in a :py:class:`CachedModel` runs the model once per distinct
+design and answers the other requests from memory.
+"""
+
+import collections
+
+import numpy as np
+
+from physprog import objective
+
+CacheStats = collections.namedtuple('CacheStats', ['hits', 'misses', 'size'])
+
+# dependent values of one design. Each value may instead be the ValueError
+# the model raised so that it can be raised again on later requests.
+_Entry = collections.namedtuple('_Entry', ['outputs', 'values'])
+
+
+class CachedModel(object):
+    """
+    Model wrapper that remembers dependent values of evaluated designs.
+
+    The wrapper follows the usual model protocol: it has a ``design``
+    attribute, an ``evaluate(x)`` method and one method per dependent name,
+    so it can be passed anywhere a model is expected. Other attributes are
+    forwarded to the wrapped model. The wrapped model's design always
+    follows the wrapper's, but the model itself only runs on cache misses.
+
+    Designs are keyed on their values rounded to a multiple of
+    ``tolerance`` (zero means exact matches only). Keep the tolerance well
+    below any finite-difference step the optimizer takes. The least
+    recently used designs are evicted once more than ``maxsize`` are stored.
+    """
+
+    def __init__(self, model, names, tolerance=0.0, maxsize=128):
+        """Wrap model, caching values of the dependents in names."""
+        self.model = model
+        self.names = list(names)
+        self.tolerance = tolerance
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    @property
+    def design(self):
+        """Return the design of the wrapped model."""
+        return self.model.design
+
+    @design.setter
+    def design(self, val):
+        self.model.design = val
+
+    def evaluate(self, x=None):
+        """Convert input design into output design parameters."""
+        if x is not None:
+            self.design = x
+        outputs = self._lookup().outputs
+        if isinstance(outputs, ValueError):
+            raise outputs
+        return outputs
+
+    def stats(self):
+        """Return hit and miss counts of this cache."""
+        return CacheStats(self.hits, self.misses, len(self._entries))
+
+    def clear(self):
+        """Forget all stored designs and statistics."""
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def __getattr__(self, name):
+        """Answer dependent requests from the cache, forward the rest."""
+        if name in self.__dict__.get('names', ()):
+            return lambda: self._value(name)
+        return getattr(self.__dict__['model'], name)
+
+    def _value(self, name):
+        """Look up the value of dependent name at the current design."""
+        value = self._lookup().values[name]
+        if isinstance(value, ValueError):
+            raise value
+        return value
+
+    def _key(self, x):
+        """Convert a design into a hashable cache key."""
+        x = np.asarray(x, dtype=float)
+        if self.tolerance:
+            x = np.round(x / self.tolerance)
+        return tuple(x.tolist())
+
+    def _lookup(self):
+        """Find the entry of the current design, evaluating it on a miss."""
+        x = self.design
+        key = self._key(x)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries[key] = self._entries.pop(key)  # most recent
+            return entry
+
+        self.misses += 1
+        entry = self._compute(x)
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _compute(self, x):
+        """Run the wrapped model and collect all dependent values."""
+        try:
+            outputs = self.model.evaluate(x)
+        except ValueError as error:
+            return _Entry(error, {name: error for name in self.names})
+        indices = objective.dependent_indices(self.model, self.names)
+        if indices is not None:
+            return _Entry(outputs, dict(zip(
+                self.names,
+                np.asarray(outputs, dtype=float)[indices].tolist())))
+        values = {}
+        for name in self.names:
+            try:
+                values[name] = getattr(self.model, name)()
+            except ValueError as error:
+                values[name] = error
+        return _Entry(outputs, values)
@@ -1,12 +1,14 @@
 """Definitions of the various kinds of Class Functions."""
 
 import collections
+import copy
+import hashlib
+import logging
 import math
+import os
 import sys
 
-import yaml
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 # data structure representing the limits of each range.
@@ -18,6 +20,16 @@ SoftBounds = collections.namedtuple(
     ['awesome', 'desirable', 'tolerable', 'undesirable', 'horrible'])
 HardBounds = collections.namedtuple('HardBounds', ['cutoff'])
 
+# frozen spline data of a built smooth class function, indexed by region.
+# coeffs holds the a,b,c,d spline coefficients, widths and lefts the size
+# and left edge of each region, and rows the same per-region values as
+# plain floats for fast scalar lookups. The exp_* fields parameterize the
+# first-region exponential and penalty scales the unacceptable region.
+SplineTable = collections.namedtuple(
+    'SplineTable',
+    ['coeffs', 'widths', 'lefts', 'rows',
+     'exp_scale', 'exp_slope', 'exp_offset', 'penalty'])
+
 # region labels
 AWESOME = 0
 DESIRABLE = 1
@@ -28,6 +40,66 @@ UNACCEPTABLE = 5
 
 MAX_ITERATIONS = 20
 
+# version of the files written by save_preferences
+CACHE_FORMAT = 1
+
+LOG = logging.getLogger(__name__)
+
+
+def _scalar_exp(x):
+    """Return e to the power x as a float, overflowing to infinity."""
+    try:
+        return math.exp(x)
+    except OverflowError:
+        return float('inf')
+
+
+def _exponential_value(g0, slope1, g, desirable, exp=np.exp):
+    """
+    Evaluate the exponential curve used in the first region.
+
+    Scalar callers pass :py:func:`_scalar_exp`, which is much faster than
+    ``np.exp`` on plain floats.
+    """
+    return g0 * exp(slope1 / g0 * g - desirable)
+
+
+def _unacceptable_value(g_last, g):
+    """Evaluate the steep penalty used outside acceptable bounds."""
+    return abs(g_last * 50 * g)
+
+
+def _spline_value(a, b, c, d, xi, width):
+    """
+    Evaluate the spline at fraction xi across a region of some width.
+
+    Powers are spelled out as products so that scalars and numpy arrays
+    round identically.
+    """
+    xi2 = xi * xi
+    xim12 = (xi - 1) * (xi - 1)
+    width2 = width * width
+    return width2 * width2 * (
+        a / 12.0 * (xi2 * xi2) +
+        b / 12.0 * (xim12 * xim12)) + c * width * xi + d
+
+
+def _exponential_derivative(g0, slope1, g, desirable, exp=np.exp):
+    """Evaluate the slope of the exponential curve used in the first region."""
+    return slope1 * exp(slope1 / g0 * g - desirable)
+
+
+def _unacceptable_derivative(g_last, g):
+    """Evaluate the slope of the penalty used outside acceptable bounds."""
+    return g_last * 50 * np.sign(g_last * g)
+
+
+def _spline_derivative(a, b, c, xi, width):
+    """Evaluate the slope of the spline at fraction xi across a region."""
+    xim1 = xi - 1
+    return width * width * width * (
+        a / 3.0 * (xi * xi * xi) + b / 3.0 * (xim1 * xim1 * xim1)) + c
+
 
 class ClassFunction(object):
     """Basic class function expressing preferences."""
@@ -59,6 +131,9 @@ class SmoothClassFunction(ClassFunction):
         self.region_slopes = []
         self.gis = []
         self.dgis = []
+        self.beta = None
+        self.trials = 0
+        self.table = None  # set once splines are built
 
     def evaluate(self, g):
         """
@@ -66,22 +141,86 @@ class SmoothClassFunction(ClassFunction):
 
         Uses the a,b,c,d coefficients in the full spline expression.
         """
+        table = self.table
         i = self.which_region(g)
         if i == AWESOME:
             # in first region we just use a simple exponential curve.
-            return self.gis[0] * (math.exp(
-                self.slopes[1] / self.gis[0] * g - self.bounds.desirable))
+            return _exponential_value(
+                table.exp_scale, table.exp_slope, g, table.exp_offset,
+                _scalar_exp)
         elif i == UNACCEPTABLE:
             # super steep outside acceptable bounds
             # NOTE: could also set these as inequality constraints
-            return abs(self.gis[-1] * 50 * g)
-        a, b, c, d = self.evaluate_spline_coeffs(i)
-        xi, width = self.get_region_fraction(g, i)
-        xi4 = xi ** 4
-        xim14 = (xi - 1) ** 4
+            return _unacceptable_value(table.penalty, g)
+        a, b, c, d, left, width = table.rows[i]
+        return _spline_value(a, b, c, d, (g - left) / width, width)
 
-        return width ** 4 * (
-            a / 12.0 * xi4 + b / 12.0 * xim14) + c * width * xi + d
+    def evaluate_many(self, g):
+        """
+        Return the computed objective values of an array of dependent values.
+
+        This gives the same results as :py:meth:`evaluate` but finds regions
+        with a sorted search and evaluates each kind of region with a mask
+        rather than looping in Python over each value.
+        """
+        table = self.table
+        g = np.asarray(g, dtype=float)
+        regions = self.which_region_many(g)
+        values = np.empty(g.shape)
+
+        awesome = regions == AWESOME
+        values[awesome] = _exponential_value(
+            table.exp_scale, table.exp_slope, g[awesome], table.exp_offset)
+
+        unacceptable = regions == UNACCEPTABLE
+        values[unacceptable] = _unacceptable_value(
+            table.penalty, g[unacceptable])
+
+        spline = ~(awesome | unacceptable)
+        i = regions[spline]
+        coeffs = table.coeffs[i]
+        width = table.widths[i]
+        xi = (g[spline] - table.lefts[i]) / width
+        values[spline] = _spline_value(
+            coeffs[:, 0], coeffs[:, 1], coeffs[:, 2], coeffs[:, 3], xi, width)
+        return values
+
+    def derivative(self, g):
+        """Return the slope of the class function at dependent value g."""
+        table = self.table
+        i = self.which_region(g)
+        if i == AWESOME:
+            return _exponential_derivative(
+                table.exp_scale, table.exp_slope, g, table.exp_offset,
+                _scalar_exp)
+        elif i == UNACCEPTABLE:
+            return _unacceptable_derivative(table.penalty, g)
+        a, b, c, _d, left, width = table.rows[i]
+        return _spline_derivative(a, b, c, (g - left) / width, width)
+
+    def derivative_many(self, g):
+        """Return the slopes of the class function at an array of values."""
+        table = self.table
+        g = np.asarray(g, dtype=float)
+        regions = self.which_region_many(g)
+        slopes = np.empty(g.shape)
+
+        awesome = regions == AWESOME
+        slopes[awesome] = _exponential_derivative(
+            table.exp_scale, table.exp_slope, g[awesome], table.exp_offset)
+
+        unacceptable = regions == UNACCEPTABLE
+        slopes[unacceptable] = _unacceptable_derivative(
+            table.penalty, g[unacceptable])
+
+        spline = ~(awesome | unacceptable)
+        i = regions[spline]
+        coeffs = table.coeffs[i]
+        width = table.widths[i]
+        xi = (g[spline] - table.lefts[i]) / width
+        slopes[spline] = _spline_derivative(
+            coeffs[:, 0], coeffs[:, 1], coeffs[:, 2], xi, width)
+        return slopes
 
     def get_region_fraction(self, g, i):
         """Compute the fraction across region i the value g is."""
@@ -93,20 +232,99 @@ class SmoothClassFunction(ClassFunction):
         return (g - bound_im1) / width, width
 
     def build_splines(self, nsc, alpha=0.05, initial_beta=1.5):
-        """Compute the splines that define this class function's values."""
+        """
+        Compute the splines that define this class function's values.
+
+        Returns the smallest beta on the grid of 0.5 steps from
+        initial_beta that makes every spline convex.
+        """
+        beta = self._search_beta(nsc, alpha, initial_beta)
+        self.table = self._build_table()
+        return beta
+
+    def _search_beta(self, nsc, alpha, initial_beta):
+        """
+        Find the smallest beta that gives convex splines and compute them.
+
+        Larger betas only steepen the splines, so once a beta works all
+        larger ones do. The grid is therefore bracketed with doubling
+        steps and then bisected, which finds the same beta as a linear scan
+        in logarithmically many trials. The trial count is kept in
+        ``self.trials``.
+        """
         # start at 1.5, increase by 0.5 as recommended in paper
         betas = np.arange(initial_beta, int(MAX_ITERATIONS / 0.5), 0.5)
-        for beta in betas:
-            self.gis = []
-            self.dgis = []
-            self.slopes = [0.0 for _bi in self.bounds]
-            self.region_slopes = []
-            self._compute_region_slopes(nsc, beta)
-            acceptable = self._compute_pointwise_slopes(alpha)
-            if acceptable:
-                return beta
-
-        raise RuntimeError('Class function construction did not converge.')
+        self.trials = 0
+        # bracket with doubling steps until some beta works.
+        low, high, step = -1, 0, 1
+        while high < len(betas) and not self._try_beta(
+                nsc, betas[high], alpha):
+            low, high = high, min(high + step, len(betas) - 1)
+            step *= 2
+            if low == high:
+                high = len(betas)
+        if high == len(betas):
+            raise RuntimeError('Class function construction did not converge.')
+
+        # bisect between the highest beta that fails and lowest that works.
+        current = True  # whether splines are computed for betas[high]
+        while high - low > 1:
+            mid = (low + high) // 2
+            current = self._try_beta(nsc, betas[mid], alpha)
+            if current:
+                high = mid
+            else:
+                low = mid
+        if not current:
+            self._try_beta(nsc, betas[high], alpha)
+        self.beta = betas[high]
+        return self.beta
+
+    def _try_beta(self, nsc, beta, alpha):
+        """Compute splines for beta and check that they are convex."""
+        self.trials += 1
+        self.gis = []
+        self.dgis = []
+        self.slopes = [0.0 for _bi in self.bounds]
+        self.region_slopes = []
+        self._compute_region_slopes(nsc, beta)
+        return self._compute_pointwise_slopes(alpha)
+
+    def _build_table(self, coeffs=None):
+        """
+        Freeze the converged splines into a :py:class:`SplineTable`.
+
+        Region 0 has no spline so its coefficient row is zero and its left
+        edge is undefined. Coefficients are computed unless given, e.g. when
+        loaded from disk.
+        """
+        nregions = len(self.bounds)
+        bounds = np.asarray(self.bounds, dtype=float)
+        if coeffs is None:
+            coeffs = np.zeros((nregions, 4))
+            for i in range(1, nregions):
+                coeffs[i] = self.evaluate_spline_coeffs(i)
+        else:
+            coeffs = np.array(coeffs, dtype=float)
+        widths = np.ones(nregions)
+        widths[1:] = bounds[1:] - bounds[:-1]
+        lefts = np.full(nregions, np.nan)
+        lefts[1:] = bounds[:-1]
+        for array in (coeffs, widths, lefts):
+            array.setflags(write=False)
+        rows = tuple(
+            tuple(row) + (left, width)
+            for row, left, width in zip(
+                coeffs.tolist(), lefts.tolist(), widths.tolist()))
+        return SplineTable(
+            coeffs=coeffs,
+            widths=widths,
+            lefts=lefts,
+            rows=rows,
+            exp_scale=float(self.gis[0]),
+            exp_slope=float(self.slopes[1]),
+            exp_offset=float(self.bounds.desirable),
+            penalty=float(self.gis[-1]))
 
     def _compute_region_slopes(self, nsc, beta):
         """Perform first loop in spline-building iteration."""
@@ -173,8 +391,14 @@ class SmoothClassFunction(ClassFunction):
         """Determine which region the value g is in."""
         raise NotImplementedError
 
+    def which_region_many(self, g):
+        """Determine which region each value in array g is in."""
+        raise NotImplementedError
+
     def plot(self, fname=None):
         """Plot this class function."""
+        # imported here so workers that only evaluate skip the GUI stack.
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
         x = np.linspace(self.bounds[0], self.bounds[-1], 200)
         y = [self.evaluate(xi) for xi in x]
         plt.figure()
@@ -195,9 +419,24 @@ class SmoothClassFunction(ClassFunction):
         Useful for plotting relative changes to values.
         """
         region = self.which_region(g)
+        if region == UNACCEPTABLE:
+            return 0.0
         xi, _width = self.get_region_fraction(g, region)
         return 1.0 - (region + xi) / 5.0
 
+    def acceptability_many(self, g):
+        """Rank the acceptability of each value in array g from 0 to 1."""
+        g = np.asarray(g, dtype=float)
+        regions = self.which_region_many(g)
+        bounds = np.asarray(self.bounds, dtype=float)
+        xi = np.full(g.shape, 0.5)
+        inner = (regions > AWESOME) & (regions < UNACCEPTABLE)
+        i = regions[inner]
+        xi[inner] = (g[inner] - bounds[i - 1]) / (bounds[i] - bounds[i - 1])
+        acceptability = 1.0 - (regions + xi) / 5.0
+        acceptability[regions == UNACCEPTABLE] = 0.0
+        return acceptability
+
 
 class SmallerBetter(SmoothClassFunction):
     """
@@ -218,6 +457,16 @@ class SmallerBetter(SmoothClassFunction):
 
         return UNACCEPTABLE  # unacceptable.
 
+    def which_region_many(self, g):
+        """
+        Determine which region each value in array g is in.
+
+        A value sitting exactly on a bound belongs to the more desirable
+        region, consistent with :py:meth:`which_region`. NaN values are
+        unacceptable.
+        """
+        return np.searchsorted(self.bounds, g, side='left')
+
 
 class LargerBetter(SmoothClassFunction):
     """
@@ -237,6 +486,15 @@ class LargerBetter(SmoothClassFunction):
 
         return UNACCEPTABLE  # unacceptable.
 
+    def which_region_many(self, g):
+        """
+        Determine which region each value in array g is in.
+
+        Bounds decrease, so the search is done on negated values.
+        """
+        return np.searchsorted(
+            -np.asarray(self.bounds, dtype=float), -np.asarray(g), side='left')
+
 
 class TwoSidedFunction(ClassFunction):
     """Class function for value or range is better."""
@@ -247,6 +505,16 @@ class TwoSidedFunction(ClassFunction):
         self._lower_bounds = lower_bounds
         self._upper_bounds = upper_bounds
 
+    @property
+    def lower_bounds(self):
+        """Return the bounds below the preferred value or range."""
+        return self._lower_bounds
+
+    @property
+    def upper_bounds(self):
+        """Return the bounds above the preferred value or range."""
+        return self._upper_bounds
+
     def evaluate(self, g):
         """Evaluate the class function against some input."""
         return NotImplementedError
@@ -301,6 +569,11 @@ class MustBeAbove(HardClassFunction):
             return 1.0
         return 0.0
 
+    def acceptability_many(self, g):
+        """Rank the acceptability of each value in array g as 0 or 1."""
+        g = np.asarray(g, dtype=float)
+        return np.where(g >= self.bounds.cutoff, 1.0, 0.0)
+
 
 class MustBeBelow(HardClassFunction):
     """Value must be below a bound (2-H)."""
@@ -315,29 +588,284 @@ class MustBeBelow(HardClassFunction):
             return 1.0
         return 0.0
 
+    def acceptability_many(self, g):
+        """Rank the acceptability of each value in array g as 0 or 1."""
+        g = np.asarray(g, dtype=float)
+        return np.where(g <= self.bounds.cutoff, 1.0, 0.0)
+
 
 class MustBeInRange(TwoSidedFunction, HardClassFunction):
     """Value must be between two bounds (3-H)."""
 
-    pass
+    def acceptability(self, g):
+        """
+        Rank the acceptability of value g on scale from 0 to 1.
+
+        Useful for plotting relative changes to values.
+        """
+        if self.lower_bounds.cutoff <= g <= self.upper_bounds.cutoff:
+            return 1.0
+        return 0.0
+
+    def acceptability_many(self, g):
+        """Rank the acceptability of each value in array g as 0 or 1."""
+        g = np.asarray(g, dtype=float)
+        return np.where((g >= self.lower_bounds.cutoff) &
+                        (g <= self.upper_bounds.cutoff), 1.0, 0.0)
+
+
+class PreferenceSet(object):
+    """
+    All class functions of a problem compiled into stacked arrays.
+
+    Evaluating preferences one class function at a time costs a Python
+    call per dependent, which dominates once there are hundreds of them.
+    Here the bounds, spline coefficients and orientation of every soft
+    class function are stacked into (n_soft, 5) arrays, and the limits of
+    the hard class functions into (n_hard,) arrays, so all dependents of
+    one or many designs are evaluated with a few numpy operations.
+
+    Dependent values are given in the order of :py:attr:`names`, i.e. the
+    order of the preferences, as a vector for one design or a matrix with
+    one row per design. Splines must be built before compiling.
+    """
+
+    def __init__(self, preferences):
+        """Compile built class functions from a mapping of name to function."""
+        self.names = list(preferences)
+        soft = [(i, name, func) for i, (name, func)
+                in enumerate(preferences.items())
+                if isinstance(func, SmoothClassFunction)]
+        hard = [(i, name, func) for i, (name, func)
+                in enumerate(preferences.items())
+                if isinstance(func, HardClassFunction)]
+        for _i, name, func in soft:
+            if not isinstance(func, (SmallerBetter, LargerBetter)):
+                raise NotImplementedError(
+                    'Cannot compile {} ({})'.format(
+                        name, func.__class__.__name__))
+            if func.table is None:
+                raise ValueError('Splines of {} are not built'.format(name))
+
+        self.soft_names = [name for _i, name, _func in soft]
+        self.soft_index = np.array([i for i, _name, _func in soft], dtype=int)
+        funcs = [func for _i, _name, func in soft]
+        self.bounds = np.array([func.bounds for func in funcs],
+                               dtype=float).reshape(-1, 5)
+        # +1 for smaller is better, -1 for larger is better
+        self.orientation = np.array(
+            [1.0 if isinstance(func, SmallerBetter) else -1.0
+             for func in funcs])
+        self.coeffs = np.array([func.table.coeffs for func in funcs],
+                               dtype=float).reshape(-1, 5, 4)
+        self.widths = np.array([func.table.widths for func in funcs],
+                               dtype=float).reshape(-1, 5)
+        self.lefts = np.array([func.table.lefts for func in funcs],
+                              dtype=float).reshape(-1, 5)
+        self.exp_scale = np.array([func.table.exp_scale for func in funcs])
+        self.exp_slope = np.array([func.table.exp_slope for func in funcs])
+        self.exp_offset = np.array([func.table.exp_offset for func in funcs])
+        self.penalty = np.array([func.table.penalty for func in funcs])
+        # oriented bounds, one row per bound, and one flat array per
+        # spline coefficient, laid out for fast lookups by region
+        self._edges = np.ascontiguousarray(
+            (self.orientation[:, np.newaxis] * self.bounds).T)
+        self._spline_columns = [np.ascontiguousarray(column) for column
+                                in self.coeffs.reshape(-1, 4).T]
+
+        self.hard_names = [name for _i, name, _func in hard]
+        self.hard_index = np.array([i for i, _name, _func in hard], dtype=int)
+        self.lower = np.full(len(hard), -np.inf)
+        self.upper = np.full(len(hard), np.inf)
+        for j, (_i, _name, func) in enumerate(hard):
+            if isinstance(func, MustBeAbove):
+                self.lower[j] = func.bounds.cutoff
+            elif isinstance(func, MustBeBelow):
+                self.upper[j] = func.bounds.cutoff
+            else:
+                self.lower[j] = func.lower_bounds.cutoff
+                self.upper[j] = func.upper_bounds.cutoff
+
+    def regions(self, values):
+        """Return the region of each soft dependent like which_region_many."""
+        g = np.asarray(values, dtype=float)[..., self.soft_index]
+        oriented = self.orientation * g
+        # count the bounds passed. values on a bound belong to the more
+        # desirable region.
+        regions = np.zeros(g.shape, dtype=np.int8)
+        for edge in self._edges:
+            np.add(regions, edge < oriented, out=regions, casting='unsafe')
+        regions[np.isnan(g)] = UNACCEPTABLE
+        return regions
+
+    def contributions(self, values):
+        """Return the class function value of each soft dependent."""
+        g = np.asarray(values, dtype=float)[..., self.soft_index]
+        regions = self.regions(values)
+        column = np.arange(len(self.soft_names))
+
+        # most values are in spline regions, so evaluate the spline for all
+        # of them, with regions 0 and 5 clipped to a valid table row, rather
+        # than selecting them first. The other two are masked in after.
+        k = column * 5 + np.clip(regions, DESIRABLE, HORRIBLE)
+        width = self.widths.ravel()[k]
+        xi = (g - self.lefts.ravel()[k]) / width
+        a, b, c, d = [column[k] for column in self._spline_columns]
+        result = _spline_value(a, b, c, d, xi, width)
+
+        awesome = regions == AWESOME
+        if awesome.any():
+            j = np.broadcast_to(column, g.shape)[awesome]
+            result[awesome] = _exponential_value(
+                self.exp_scale[j], self.exp_slope[j], g[awesome],
+                self.exp_offset[j])
+        unacceptable = regions == UNACCEPTABLE
+        if unacceptable.any():
+            result[unacceptable] = _unacceptable_value(
+                self.penalty[np.broadcast_to(column, g.shape)[unacceptable]],
+                g[unacceptable])
+        return np.asarray(result)
+
+    def evaluate(self, values):
+        """
+        Return the aggregate objective and the soft contributions.
+
+        For a matrix of values, there is one aggregate per row and one row
+        of contributions per design.
+        """
+        contributions = self.contributions(values)
+        if not contributions.shape[-1]:
+            return np.zeros(contributions.shape[:-1]), contributions
+        # a running sum adds in the same order as the scalar objective
+        aggregate = np.cumsum(contributions, axis=-1)[..., -1]
+        return aggregate, contributions
+
+    def feasible(self, values):
+        """Return whether all hard constraints hold."""
+        g = np.asarray(values, dtype=float)[..., self.hard_index]
+        return np.all((g >= self.lower) & (g <= self.upper), axis=-1)
+
+    def violation(self, values):
+        """
+        Return how far the hard constraints are violated in total.
+
+        Zero means feasible. Non-finite hard dependents violate infinitely.
+        """
+        g = np.asarray(values, dtype=float)[..., self.hard_index]
+        with np.errstate(invalid='ignore'):
+            excess = (np.maximum(self.lower - g, 0.0) +
+                      np.maximum(g - self.upper, 0.0))
+        excess[~np.isfinite(g)] = np.inf
+        return excess.sum(axis=-1)
+
 
+def from_input(filename, cache_dir=None):
+    """
+    Build class functions defined in an input file.
+
+    With ``cache_dir``, built class functions are saved there under a hash
+    of the input file's content and later loaded directly when the content
+    matches, skipping both parsing and spline construction.
+    """
+    if cache_dir is not None:
+        with open(filename, 'rb') as inp:
+            digest = hashlib.sha256(inp.read()).hexdigest()
+        cached = os.path.join(
+            cache_dir, 'prefs-v{}-{}.npz'.format(CACHE_FORMAT, digest))
+        if os.path.exists(cached):
+            LOG.info('Loading built preferences from %s', cached)
+            return load_preferences(cached)
+
+    import yaml  # pylint: disable=import-outside-toplevel
 
-def from_input(filename):
-    """Build class functions defined in an input file."""
     funcs = collections.OrderedDict()  # order matters.
     with open(filename) as inp:
-        userinp = yaml.load(inp)
+        userinp = yaml.safe_load(inp)
         for details in userinp['dependents']:
             dependent_name = details['name']
-            print('Loading {}'.format(dependent_name))
+            LOG.debug('Loading %s', dependent_name)
             cls = getattr(sys.modules[__name__], details['class'])
             if issubclass(cls, SmoothClassFunction):
                 bounds = SoftBounds(*details['bounds'])
                 funcs[dependent_name] = cls(bounds)
+            elif issubclass(cls, TwoSidedFunction):
+                lower, upper = details['bounds']
+                funcs[dependent_name] = cls(
+                    HardBounds(lower), HardBounds(upper))
             else:
                 bound = HardBounds(details['bound'])
                 funcs[dependent_name] = cls(bound)
     build_all_splines(funcs.values())
+
+    if cache_dir is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        save_preferences(funcs, cached)
+    return funcs
+
+
+def save_preferences(funcs, filename):
+    """
+    Save built class functions to a compact binary file.
+
+    Stores bounds, class names and, for smooth class functions, the
+    converged beta, slopes, values and spline coefficients so that
+    :py:func:`load_preferences` needs no spline construction. The file is
+    written to a temporary name first so that concurrent readers never see
+    a partial file.
+    """
+    nfuncs = len(funcs)
+    nregions = len(SoftBounds._fields)
+    arrays = {
+        'names': np.array(list(funcs.keys()), dtype=str),
+        'classes': np.array(
+            [func.__class__.__name__ for func in funcs.values()], dtype=str),
+        'bounds': np.full((nfuncs, nregions), np.nan),
+        'betas': np.full(nfuncs, np.nan),
+    }
+    for name in ('slopes', 'region_slopes', 'gis', 'dgis'):
+        arrays[name] = np.full((nfuncs, nregions), np.nan)
+    arrays['coeffs'] = np.full((nfuncs, nregions, 4), np.nan)
+
+    for i, func in enumerate(funcs.values()):
+        if isinstance(func, TwoSidedFunction):
+            arrays['bounds'][i, :2] = (
+                func.lower_bounds.cutoff, func.upper_bounds.cutoff)
+        elif isinstance(func, SmoothClassFunction):
+            arrays['bounds'][i] = func.bounds
+            arrays['betas'][i] = func.beta
+            for name in ('slopes', 'region_slopes', 'gis', 'dgis'):
+                arrays[name][i] = getattr(func, name)
+            arrays['coeffs'][i] = func.table.coeffs
+        else:
+            arrays['bounds'][i, 0] = func.bounds.cutoff
+
+    partial = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(partial, 'wb') as out:
+        np.savez(out, **arrays)
+    os.replace(partial, filename)
+
+
+def load_preferences(filename):
+    """Load class functions saved by :py:func:`save_preferences`."""
+    funcs = collections.OrderedDict()  # order matters.
+    with np.load(filename, allow_pickle=False) as data:
+        for i, (name, clsname) in enumerate(zip(data['names'],
+                                                data['classes'])):
+            cls = getattr(sys.modules[__name__], str(clsname))
+            bounds = data['bounds'][i].tolist()
+            if issubclass(cls, SmoothClassFunction):
+                func = cls(SoftBounds(*bounds))
+                func.beta = float(data['betas'][i])
+                for attr in ('slopes', 'region_slopes', 'gis', 'dgis'):
+                    setattr(func, attr, data[attr][i].tolist())
+                func.table = func._build_table(  # pylint: disable=protected-access
+                    data['coeffs'][i])
+            elif issubclass(cls, TwoSidedFunction):
+                func = cls(HardBounds(bounds[0]), HardBounds(bounds[1]))
+            else:
+                func = cls(HardBounds(bounds[0]))
+            funcs[str(name)] = func
     return funcs
 
 
@@ -345,7 +873,12 @@ def build_all_splines(functions):
     """
     Perform iteration to define splines.
 
-    This loops over all soft constraints until the value of beta converges.
+    All soft class functions must share the beta of the one that needs
+    the largest. Each function only depends on its own bounds and beta, so
+    each one searches for its smallest working beta, starting from the
+    largest found so far. The ones that settled on a smaller beta are then
+    rebuilt once at the final value. This gives the same beta as sweeping
+    all functions until beta stops changing. Returns the converged beta.
     """
     softfuncs = [
         func for func in functions
@@ -353,23 +886,96 @@ def build_all_splines(functions):
     ]
     nsc = len(softfuncs)
     max_beta = 1.5
-    last_beta = max_beta
-    for _i in range(MAX_ITERATIONS):
-        print('beta is {0}'.format(max_beta))
-        for func in softfuncs:
-            new_beta = func.build_splines(
-                nsc, initial_beta=max_beta)  # returns beta required for convex
-            if not new_beta:
-                raise RuntimeError(
-                    'Error building {0}. Beta did not converge.'.format(func))
-            max_beta = max(max_beta, new_beta)
-
-        if max_beta == last_beta:
-            # success.
-            break
-        last_beta = max_beta
+    trials = 0
+    # pylint: disable=protected-access
+    for func in softfuncs:
+        # returns beta required for convex
+        new_beta = func._search_beta(nsc, 0.05, max_beta)
+        trials += func.trials
+        max_beta = max(max_beta, new_beta)
+
+    for func in softfuncs:
+        if func.beta != max_beta:
+            func._search_beta(nsc, 0.05, max_beta)
+            trials += func.trials
+        func.table = func._build_table()
+
+    LOG.info('Successful build of %d PP class functions at beta %s '
+             'in %d trials', nsc, max_beta, trials)
+    return max_beta
+
+
+def update_bounds(funcs, name, bounds):
+    """
+    Change the bounds of one class function and rebuild what depends on it.
+
+    ``funcs`` is a mapping of built class functions such as
+    :py:func:`from_input` returns, and ``bounds`` the new
+    :py:class:`SoftBounds`, :py:class:`HardBounds` or, for two-sided
+    functions, a (lower, upper) pair of them.
+
+    Hard class functions need no rebuild. A soft one searches for its own
+    smallest working beta. Only if that moves the shared beta, up or down,
+    are the other soft class functions rebuilt at the new beta. The result
+    is the same as building all functions from scratch. Returns the shared
+    beta. If no splines can be built for the new bounds, all class
+    functions are left as they were and the RuntimeError is raised.
+    """
+    # rebuilding replaces attributes rather than changing them in place, so
+    # shallow copies of the instance dictionaries can restore everything
+    saved = [(other, dict(other.__dict__)) for other in funcs.values()]
+    try:
+        return _update_bounds(funcs, name, bounds)
+    except RuntimeError:
+        for other, state in saved:
+            other.__dict__.clear()
+            other.__dict__.update(state)
+        raise
+
+
+def _update_bounds(funcs, name, bounds):
+    """Change the bounds and rebuild, as in :py:func:`update_bounds`."""
+    func = funcs[name]
+    if isinstance(func, TwoSidedFunction):
+        func._lower_bounds, func._upper_bounds = bounds  # pylint: disable=protected-access
     else:
-        raise RuntimeError(
-            'PP algorithm to build class functions did not converge')
+        func.bounds = bounds
+    softfuncs = [other for other in funcs.values()
+                 if issubclass(other.__class__, SmoothClassFunction)]
+    if func not in softfuncs:
+        return softfuncs[0].beta if softfuncs else None
 
-    print('Successful build of {0} PP class functions'.format(nsc))
+    nsc = len(softfuncs)
+    others = [other for other in softfuncs if other is not func]
+    old_beta = others[0].beta if others else None
+    # pylint: disable=protected-access
+    required = func._search_beta(nsc, 0.05, 1.5)
+    if old_beta is None:
+        beta = required
+    elif required >= old_beta:
+        beta = required
+    else:
+        # the shared beta may drop if this function was the one needing it
+        beta = old_beta
+        while beta - 0.5 >= required and all(
+                _works_at(other, nsc, beta - 0.5) for other in others):
+            beta -= 0.5
+
+    if beta != required:
+        func._try_beta(nsc, beta, 0.05)
+        func.beta = beta
+    func.table = func._build_table()
+    if beta != old_beta:
+        for other in others:
+            other._try_beta(nsc, beta, 0.05)
+            other.beta = beta
+            other.table = other._build_table()
+    LOG.info('Updated bounds of %s, rebuilding %d class functions at beta '
+             '%s', name, nsc if beta != old_beta else 1, beta)
+    return beta
+
+
+def _works_at(func, nsc, beta):
+    """Check a beta on a copy, leaving the built function untouched."""
+    probe = copy.copy(func)
+    return probe._try_beta(nsc, beta, 0.05)  # pylint: disable=protected-access
@@ -0,0 +1,181 @@
+"""
+Aggregate objectives generated as code for fixed preferences.
+
+Once the splines are built, the preferences no longer change, yet the
+generic objective still loops over the class functions, looks up each
+region and unpacks its spline row on every call. Here the built
+preferences are instead written out as the source of one Python function,
+with every region edge and spline coefficient inlined as a literal, and
+that source is compiled once.
+
+The generated function takes the soft dependent values of one design as a
+sequence and follows exactly the arithmetic of
+:py:meth:`physprog.classfunctions.SmoothClassFunction.evaluate`. Results
+agree with the generic path to round-off. They may differ in the last bit
+only because :py:func:`math.exp` is used rather than :py:func:`numpy.exp`.
+Batches of designs, for which Python-level code is no help, are handed to
+a :py:class:`~physprog.classfunctions.PreferenceSet`.
+"""
+
+import collections
+import math
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+
+
+def generate_source(preferences):
+    """
+    Return the source of a function aggregating built soft preferences.
+
+    The function is named ``aggregate``, and it expects the soft dependent
+    values in preference order.
+    """
+    soft = _soft_functions(preferences)
+    nsoft = len(soft)
+    lines = [
+        'def aggregate(values):',
+        '    """Return the aggregate objective of one or many designs."""',
+        '    if isinstance(values, _ndarray):',
+        '        if values.ndim > 1:',
+        '            return _aggregate_many(values)',
+        '        values = values.tolist()',
+    ]
+    if nsoft:
+        lines.append('    {}, = values'.format(
+            ', '.join('g{}'.format(j) for j in range(nsoft))))
+    lines.append('    total = 0.0')
+    for j, (name, func) in enumerate(soft):
+        lines.append('    # {!r} ({})'.format(name, func.__class__.__name__))
+        lines.extend(_scalar_lines(func, 'g{}'.format(j)))
+    lines.append('    return total')
+    return '\n'.join(lines) + '\n'
+
+
+def compile_aggregate(preferences):
+    """
+    Compile a function aggregating built soft preferences.
+
+    The function returns the aggregate objective of one design (a sequence
+    of soft dependent values) as a float, or of many designs (an
+    (N, n_soft) array) as an array. Its ``names`` attribute lists the soft
+    dependents in the order expected, and ``source`` holds its code.
+    """
+    soft = collections.OrderedDict(_soft_functions(preferences))
+    compiled = classfunctions.PreferenceSet(soft)
+    source = generate_source(preferences)
+    namespace = {
+        '_abs': abs, '_exp': _exp, '_ndarray': np.ndarray,
+        '_aggregate_many': lambda values: compiled.evaluate(values)[0]}
+    exec(compile(source, '<physprog aggregate>', 'exec'), namespace)  # pylint: disable=exec-used
+    aggregate = namespace['aggregate']
+    aggregate.names = list(soft)
+    aggregate.source = source
+    return aggregate
+
+
+def build_objective(model, preferences):
+    """
+    Build an objective function like the generic one, from compiled code.
+
+    This is a drop-in replacement for
+    :py:func:`physprog.objective.build_objective` without instrumentation.
+    """
+    aggregate = compile_aggregate(preferences)
+    read = objective.dependent_reader(model, aggregate.names)
+
+    def compiled_objective(x):
+        """Evaluate the aggregate-objective function."""
+        try:
+            param_vals = read(x)
+        except ValueError:
+            return objective.INVALID_PENALTY
+        return aggregate(param_vals)
+
+    return compiled_objective
+
+
+def _exp(x):
+    """Return e to the power x, overflowing to infinity like numpy."""
+    try:
+        return math.exp(x)
+    except OverflowError:
+        return float('inf')
+
+
+def _soft_functions(preferences):
+    """Return the built soft class functions that can be compiled."""
+    soft = []
+    for name, func in preferences.items():
+        if not isinstance(func, classfunctions.SmoothClassFunction):
+            continue
+        if not isinstance(func, (classfunctions.SmallerBetter,
+                                 classfunctions.LargerBetter)):
+            raise NotImplementedError('Cannot compile {} ({})'.format(
+                name, func.__class__.__name__))
+        if func.table is None:
+            raise ValueError('Splines of {} are not built'.format(name))
+        soft.append((name, func))
+    return soft
+
+
+def _constants(func):
+    """
+    Return the literals of each region of a built class function.
+
+    Products and quotients of table values are folded here exactly as the
+    generic evaluation would compute them.
+    """
+    table = func.table
+    exp_scale = float(table.exp_scale)
+    exponential = (_literal(exp_scale),
+                   _literal(float(table.exp_slope) / exp_scale),
+                   _literal(float(table.exp_offset)))
+    splines = []
+    for a, b, c, d, left, width in table.rows[1:]:
+        width2 = width * width
+        splines.append((_literal(left), _literal(width),
+                        _literal(width2 * width2), _literal(a / 12.0),
+                        _literal(b / 12.0), _literal(c * width),
+                        _literal(d)))
+    penalty = _literal(float(table.penalty) * 50)
+    return exponential, splines, penalty
+
+
+def _scalar_lines(func, g):
+    """Return code adding the value of one dependent g to total."""
+    # values on a bound belong to the more desirable region
+    compare = '<=' if isinstance(func, classfunctions.SmallerBetter) else '>='
+    bounds = [_literal(float(bound)) for bound in func.bounds]
+    (scale, rate, offset), splines, penalty = _constants(func)
+    lines = [
+        '    if {} {} {}:'.format(g, compare, bounds[0]),
+        '        total += {} * _exp({} * {} - {})'.format(scale, rate, g,
+                                                          offset),
+    ]
+    for bound, (left, width, width4, a12, b12, cwidth, d) in zip(
+            bounds[1:], splines):
+        lines.extend([
+            '    elif {} {} {}:'.format(g, compare, bound),
+            '        xi = ({} - {}) / {}'.format(g, left, width),
+            '        xi2 = xi * xi',
+            '        xim12 = (xi - 1) * (xi - 1)',
+            '        total += {} * ({} * (xi2 * xi2) + {} * (xim12 * xim12))'
+            ' + {} * xi + {}'.format(width4, a12, b12, cwidth, d),
+        ])
+    lines.extend([
+        '    else:',
+        '        total += _abs({} * {})'.format(penalty, g),
+    ])
+    return lines
+
+
+def _literal(value):
+    """Return source code for a float that reads back to the same float."""
+    if math.isnan(value):
+        return "float('nan')"
+    if math.isinf(value):
+        return "float('{}inf')".format('-' if value < 0 else '')
+    return '({!r})'.format(value)
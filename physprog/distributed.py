@@ -0,0 +1,296 @@
+"""
+Model evaluation spread over worker processes on other machines.
+
+A :py:class:`DistributedModel` stands in for a model in the optimizer
+while the real model runs on simulation nodes. It hosts a broker, i.e. a
+:py:mod:`multiprocessing.managers` server holding a task queue and a
+result queue. Designs are split into batches and put on the task queue.
+Workers anywhere on the network connect to the broker, take batches,
+evaluate them with their own copy of the model and send back the
+dependent values.
+
+A worker announces when it starts a batch. A batch that has not come back
+``timeout`` seconds later, e.g. because its worker died, is queued again
+for another worker, up to ``retries`` times. Start workers on other
+machines with::
+
+    python -m physprog.distributed HOST:PORT --authkey KEY --model pkg.mod:Model
+
+where ``pkg.mod:Model`` is called without arguments to make the model.
+On one machine, :py:meth:`DistributedModel.spawn_workers` starts local
+worker processes instead.
+"""
+
+import argparse
+import importlib
+import ipaddress
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.managers
+import os
+import queue
+import sys
+import time
+
+import numpy as np
+
+from physprog import objective
+
+LOG = logging.getLogger(__name__)
+
+# kinds of messages workers put on the result queue
+STARTED = 'started'
+DONE = 'done'
+FAILED = 'failed'
+
+# queues of the broker, created in the broker's server process
+_QUEUES = {}
+
+
+def _tasks():
+    """Return the task queue of this broker."""
+    return _QUEUES.setdefault('tasks', queue.Queue())
+
+
+def _results():
+    """Return the result queue of this broker."""
+    return _QUEUES.setdefault('results', queue.Queue())
+
+
+class _Broker(multiprocessing.managers.BaseManager):
+    """Manager serving the task and result queues."""
+
+
+_Broker.register('tasks', callable=_tasks)
+_Broker.register('results', callable=_results)
+
+
+class DistributedModel(object):
+    """
+    Model whose evaluations run on remote workers.
+
+    The model follows the array model protocol: ``evaluate(x)`` returns
+    the dependents in ``names`` as one array, NaN for designs the workers
+    cannot evaluate. It also provides ``evaluate_many(designs)``, so the
+    batch objective and differential evolution send a whole population at
+    once, in tasks of up to ``batchsize`` designs.
+
+    The broker listens on ``address``, a (host, port) pair where port 0
+    picks a free port (see :py:attr:`address`). Use ``('', port)`` to
+    accept workers from other machines. Evaluations wait until a worker
+    connects.
+
+    Broker and workers exchange pickles, so anyone holding ``authkey`` can
+    run code on the workers. Without a key, a random one is generated,
+    which local workers share. Listening beyond the loopback interface
+    requires an explicit, secret key.
+    """
+
+    def __init__(self, names, design=None, address=('127.0.0.1', 0),
+                 authkey=None, batchsize=16, timeout=600.0, retries=3):
+        """Start the broker for a model with dependents in names."""
+        if authkey is None:
+            if not _is_loopback(address[0]):
+                raise ValueError(
+                    'An authkey is needed to accept workers on {}'.format(
+                        address[0] or 'all interfaces'))
+            authkey = os.urandom(32)
+        self.names = list(names)
+        self.dependents = self.names
+        self.batchsize = batchsize
+        self.timeout = timeout
+        self.retries = retries
+        self.authkey = authkey
+        self._design = design
+        self._last = None
+        self._ids = itertools.count()
+        self._workers = []
+        self._broker = _Broker(address, authkey)
+        self._broker.start()
+        self._tasks = self._broker.tasks()
+        self._results = self._broker.results()
+
+    @property
+    def address(self):
+        """Return the (host, port) pair workers connect to."""
+        return self._broker.address
+
+    @property
+    def design(self):
+        """Return the current design."""
+        return self._design
+
+    @design.setter
+    def design(self, val):
+        self._design = val
+
+    def __enter__(self):
+        """Use the broker within a with block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop local workers and the broker at the end of a with block."""
+        self.close()
+
+    def evaluate(self, x=None):
+        """Evaluate the current design, returning dependents in order."""
+        if x is not None:
+            self.design = x
+        key = tuple(np.asarray(self._design, dtype=float).tolist())
+        # the objective and each constraint ask about the same design
+        if self._last is None or self._last[0] != key:
+            self._last = key, self._run(np.array([key]))[0]
+        return self._last[1].copy()
+
+    def evaluate_many(self, designs):
+        """Evaluate designs on the workers into arrays of each dependent."""
+        values = self._run(np.asarray(designs, dtype=float))
+        return {name: values[:, column]
+                for column, name in enumerate(self.names)}
+
+    def spawn_workers(self, model, count=1):
+        """Start count worker processes on this machine evaluating model."""
+        for _i in range(count):
+            worker = multiprocessing.Process(
+                target=run_worker, args=(self.address, self.authkey, model),
+                daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self._workers[-count:]
+
+    def close(self):
+        """Stop local workers and shut down the broker."""
+        for _worker in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(self.timeout)
+        self._workers = []
+        self._broker.shutdown()
+
+    def _run(self, designs):
+        """Evaluate designs in batches on the workers, retrying lost ones."""
+        values = np.full((len(designs), len(self.names)), np.nan)
+        pending = {}
+        for start in range(0, len(designs), self.batchsize):
+            rows = slice(start, start + self.batchsize)
+            pending[self._submit(designs[rows])] = _Task(rows, designs[rows])
+
+        while pending:
+            task_id, kind, payload = self._next_message(pending)
+            task = pending.get(task_id)
+            if task is None:
+                continue  # from a batch that was already retried
+            if kind == STARTED:
+                task.deadline = time.monotonic() + self.timeout
+            elif kind == DONE:
+                values[task.rows] = payload
+                del pending[task_id]
+            else:
+                LOG.warning('Worker failed on batch %d: %s', task_id, payload)
+                self._retry(pending, task_id)
+        return values
+
+    def _submit(self, designs):
+        """Put a batch on the task queue and return its task ID."""
+        task_id = next(self._ids)
+        self._tasks.put((task_id, self.names, designs))
+        return task_id
+
+    def _next_message(self, pending):
+        """Wait for a worker message, retrying batches that time out."""
+        while True:
+            deadlines = [task.deadline for task in pending.values()
+                         if task.deadline is not None]
+            wait = (max(min(deadlines) - time.monotonic(), 0.0)
+                    if deadlines else None)
+            try:
+                return self._results.get(timeout=wait)
+            except queue.Empty:
+                now = time.monotonic()
+                for task_id, task in list(pending.items()):
+                    if task.deadline is not None and task.deadline <= now:
+                        LOG.warning('Batch %d timed out', task_id)
+                        self._retry(pending, task_id)
+                if not pending:
+                    return None, None, None
+
+    def _retry(self, pending, task_id):
+        """Queue a lost batch again, or give up on it after enough tries."""
+        task = pending.pop(task_id)
+        if task.attempts >= self.retries:
+            LOG.error('Giving up on designs %s after %d attempts',
+                      task.designs.tolist(), task.attempts + 1)
+            return
+        retried = _Task(task.rows, task.designs, task.attempts + 1)
+        pending[self._submit(task.designs)] = retried
+
+
+def _is_loopback(host):
+    """Whether a host name or address only accepts local connections."""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class _Task(object):
+    """Bookkeeping of one batch of designs sent to the workers."""
+
+    def __init__(self, rows, designs, attempts=0):
+        """Track designs filling rows of the result, not yet started."""
+        self.rows = rows
+        self.designs = designs
+        self.attempts = attempts
+        self.deadline = None
+
+
+def run_worker(address, authkey, model):
+    """
+    Evaluate batches from the broker at address with model until stopped.
+
+    Designs the model rejects with a ValueError get NaN dependents. Other
+    errors fail the whole batch, which the broker then retries.
+    """
+    broker = _Broker(tuple(address), authkey)
+    broker.connect()
+    tasks, results = broker.tasks(), broker.results()
+    while True:
+        try:
+            task = tasks.get()
+        except (EOFError, ConnectionError):
+            return  # the broker is gone
+        if task is None:
+            return
+        task_id, names, designs = task
+        results.put((task_id, STARTED, None))
+        try:
+            values = objective.dependent_matrix(model, designs, names)
+        except Exception as error:  # pylint: disable=broad-except
+            results.put((task_id, FAILED, repr(error)))
+        else:
+            results.put((task_id, DONE, values))
+
+
+def main(argv=None):
+    """Run a worker from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Evaluate designs for a physprog broker.')
+    parser.add_argument('address', help='HOST:PORT of the broker')
+    parser.add_argument('--authkey', required=True,
+                        help='secret key shared with the broker')
+    parser.add_argument('--model', required=True,
+                        help='MODULE:CALLABLE making the model')
+    args = parser.parse_args(argv)
+    host, port = args.address.rsplit(':', 1)
+    module, factory = args.model.split(':')
+    model = getattr(importlib.import_module(module), factory)()
+    logging.basicConfig(level=logging.INFO)
+    LOG.info('Working for %s', args.address)
+    run_worker((host, int(port)), args.authkey.encode(), model)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
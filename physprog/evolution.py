@@ -0,0 +1,180 @@
+"""
+Differential evolution driven by the batched objective.
+
+Gradient-based local search stalls easily on the flat, exponential tails
+of the class functions. Differential evolution instead moves a population
+of designs within bounds and scores each whole generation at once, so
+models with ``evaluate_many`` are evaluated in one vectorized call per
+generation. Other models can spread each generation over a process pool.
+
+Hard class functions act as a feasibility mask: a feasible design always
+beats an infeasible one, and infeasible designs are compared by how far
+they violate the constraints. The best design can then be polished with
+the usual local optimizer.
+"""
+
+import concurrent.futures
+import logging
+
+import numpy as np
+import scipy.optimize
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import optimize
+
+LOG = logging.getLogger(__name__)
+
+# model and dependent names of a worker process
+_WORKER = {}
+
+
+def differential_evolution(model, preferences, bounds, popsize=15,
+                           generations=200, mutation=0.7, crossover=0.9,
+                           tol=1e-6, polish=True, seed=None,
+                           max_workers=None):
+    """
+    Optimize a model with differential evolution (DE/rand/1/bin).
+
+    ``bounds`` gives a (low, high) pair for each design variable. The
+    population holds ``popsize`` designs per design variable and starts
+    from a Latin hypercube that includes the model's current design. The
+    search stops after ``generations`` generations, or once the spread of
+    the population's values falls within ``tol`` of their mean. With
+    ``max_workers``, each generation of a model without ``evaluate_many``
+    is split across that many processes.
+
+    With ``polish``, the best design is refined with the local optimizer
+    within ``bounds`` and kept if that improves it. Returns a
+    ``scipy.optimize.OptimizeResult`` and leaves the model at its design.
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    low, high = bounds.T
+    names = list(preferences)
+    compiled = classfunctions.PreferenceSet(preferences)
+    rng = np.random.RandomState(seed)
+    npop = max(popsize * len(bounds), 5)
+
+    executor = None
+    if max_workers and not hasattr(model, 'evaluate_many'):
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(model, names))
+    try:
+        def score(designs):
+            """Return the aggregate value and violation of each design."""
+            if executor is None:
+                values = objective.dependent_matrix(model, designs, names)
+            else:
+                values = _evaluate_in_pool(executor, max_workers, designs,
+                                           names)
+            aggregate, _contributions = compiled.evaluate(values)
+            soft = values[:, compiled.soft_index]
+            aggregate[~np.all(np.isfinite(soft), axis=1)] = (
+                objective.INVALID_PENALTY)
+            return aggregate, compiled.violation(values)
+
+        population = optimize.sample_designs(bounds, npop, 'lhs', seed)
+        population[0] = np.clip(np.asarray(model.design, dtype=float),
+                                low, high)
+        values, violations = score(population)
+        nfev = npop
+        generation = 0
+        converged = False
+        while generation < generations and not converged:
+            generation += 1
+            trials = _trial_designs(population, mutation, crossover,
+                                    low, high, rng)
+            trial_values, trial_violations = score(trials)
+            nfev += npop
+            better = _beats(trial_values, trial_violations, values,
+                            violations)
+            population[better] = trials[better]
+            values[better] = trial_values[better]
+            violations[better] = trial_violations[better]
+            feasible = violations == 0.0
+            if feasible.all():
+                converged = (np.std(values) <=
+                             tol * (1.0 + abs(np.mean(values))))
+            LOG.debug('Generation %d best value %.4f, %d feasible',
+                      generation, values[_best(values, violations)],
+                      feasible.sum())
+        best = _best(values, violations)
+        x, fun, violation = population[best], values[best], violations[best]
+        LOG.info('Differential evolution reached value %.4f after %d '
+                 'generations', fun, generation)
+        if polish:
+            model.design = x
+            local = optimize._minimize(  # pylint: disable=protected-access
+                model, preferences, bounds=bounds)
+            nfev += local.nfev
+            local_values, local_violations = score(local.x[np.newaxis, :])
+            inside = np.all((local.x >= low) & (local.x <= high))
+            if inside and _beats(local_values, local_violations, [fun],
+                                 [violation])[0]:
+                LOG.info('Polishing improved the value to %.4f',
+                         local_values[0])
+                x = local.x
+                fun, violation = local_values[0], local_violations[0]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    model.evaluate(x)
+    return scipy.optimize.OptimizeResult(
+        x=x, fun=fun, success=violation == 0.0, nit=generation, nfev=nfev,
+        converged=converged, population=population,
+        population_values=values,
+        message=('Population converged' if converged
+                 else 'Maximum number of generations reached'))
+
+
+def _trial_designs(population, mutation, crossover, low, high, rng):
+    """Mutate and cross over each member of the population."""
+    npop, ndim = population.shape
+    # three distinct members other than the target for each target
+    picks = np.array([rng.choice(npop - 1, 3, replace=False)
+                      for _i in range(npop)])
+    picks += picks >= np.arange(npop)[:, np.newaxis]
+    mutants = population[picks[:, 0]] + mutation * (
+        population[picks[:, 1]] - population[picks[:, 2]])
+    cross = rng.uniform(size=(npop, ndim)) < crossover
+    cross[np.arange(npop), rng.randint(ndim, size=npop)] = True
+    trials = np.where(cross, mutants, population)
+    # bring variables that left the bounds back to a random point inside
+    outside = (trials < low) | (trials > high)
+    trials[outside] = (low + rng.uniform(size=(npop, ndim)) *
+                       (high - low))[outside]
+    return trials
+
+
+def _beats(values, violations, other_values, other_violations):
+    """Whether each design is at least as good as the other one."""
+    values = np.asarray(values)
+    violations = np.asarray(violations)
+    other_violations = np.asarray(other_violations)
+    both_feasible = (violations == 0.0) & (other_violations == 0.0)
+    return np.where(both_feasible, values <= np.asarray(other_values),
+                    violations <= other_violations)
+
+
+def _best(values, violations):
+    """Return the index of the best design, feasible ones first."""
+    return int(np.lexsort((values, violations))[0])
+
+
+def _init_worker(model, names):
+    """Keep a copy of the model in a worker process."""
+    _WORKER['model'] = model
+    _WORKER['names'] = names
+
+
+def _evaluate_chunk(designs):
+    """Evaluate the dependents of some designs in a worker process."""
+    return objective.dependent_matrix(_WORKER['model'], designs,
+                                      _WORKER['names'])
+
+
+def _evaluate_in_pool(executor, nchunks, designs, names):
+    """Evaluate a generation split into chunks across the pool."""
+    chunks = executor.map(_evaluate_chunk, np.array_split(designs, nchunks))
+    return np.concatenate(list(chunks)).reshape(len(designs), len(names))
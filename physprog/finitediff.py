@@ -0,0 +1,157 @@
+"""
+Finite-difference gradients evaluated in parallel.
+
+Without an analytic Jacobian the optimizer perturbs one design variable
+at a time, so each iteration costs n_design + 1 model runs back to back.
+:py:class:`ParallelDifferences` instead evaluates the whole stencil for
+the aggregate objective and the hard constraints at once across a process
+pool, and serves the Jacobians of all of them from that one batch.
+"""
+
+import concurrent.futures
+
+import numpy as np
+
+from physprog import objective
+from physprog import optimize
+
+# objective and constraint functions of the model copy in a worker process
+_WORKER = {}
+
+
+class ParallelDifferences(object):
+    """
+    Aggregate objective, constraints and their gradients from one stencil.
+
+    ``scheme`` is ``'forward'`` (n_design + 1 points) or ``'central'``
+    (2 n_design + 1 points, more accurate). ``step`` is the relative
+    perturbation, defaulting to the usual optimum for each scheme. Each of
+    up to ``max_workers`` worker processes gets its own copy of the model.
+
+    Values are evaluated at the requested design alone, since line
+    searches ask for many values but gradients only at accepted designs.
+    The rest of the stencil is evaluated once a gradient is asked for, so
+    asking for the value and then the gradient at the same design costs
+    n_design + 1 (forward) model runs in total. The last values and
+    gradients are kept, and copies are returned since the optimizer may
+    modify them in place. Use as a context manager, or call
+    :py:meth:`close`, to stop the pool.
+    """
+
+    def __init__(self, model, preferences, scheme='forward', step=None,
+                 max_workers=None):
+        """Start worker processes holding copies of model."""
+        if scheme not in ('forward', 'central'):
+            raise ValueError('Unknown difference scheme {}'.format(scheme))
+        self.scheme = scheme
+        if step is None:
+            step = np.finfo(float).eps ** (0.5 if scheme == 'forward'
+                                           else 1.0 / 3.0)
+        self.step = step
+        self.batches = 0
+        # design and values of the last center point and gradient
+        self._center = None
+        self._jacobian = None
+        self.has_constraints = optimize.build_constraint_function(
+            model, preferences) is not None
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers, initializer=_init_worker,
+            initargs=(model, preferences))
+
+    def __enter__(self):
+        """Use the pool within a with block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop the pool at the end of a with block."""
+        self.close()
+
+    def close(self):
+        """Stop the worker processes."""
+        self._executor.shutdown()
+
+    def objective(self, x):
+        """Evaluate the aggregate objective at x."""
+        return self._values_at(x)[0]
+
+    def gradient(self, x):
+        """Evaluate the gradient of the aggregate objective at x."""
+        return self._gradients_at(x)[0].copy()
+
+    def constraint_values(self, x):
+        """Evaluate all hard constraints at x, one row per constraint."""
+        return self._values_at(x)[1:].copy()
+
+    def constraint_jacobian(self, x):
+        """Evaluate the Jacobian of all hard constraints at x."""
+        return self._gradients_at(x)[1:].copy()
+
+    def constraints(self):
+        """Return the scipy constraint covering all hard constraints."""
+        if not self.has_constraints:
+            return []
+        return [{'type': 'ineq', 'fun': self.constraint_values,
+                 'jac': self.constraint_jacobian}]
+
+    def stencil(self, x):
+        """Return the designs to evaluate and the step of each variable."""
+        x = np.asarray(x, dtype=float)
+        steps = self.step * np.maximum(1.0, np.abs(x))
+        steps = (x + steps) - x  # exactly representable perturbations
+        offsets = np.diag(steps)
+        if self.scheme == 'forward':
+            points = np.vstack([x, x + offsets])
+        else:
+            points = np.vstack([x, x + offsets, x - offsets])
+        return points, steps
+
+    def _values_at(self, x):
+        """Evaluate the center point x unless it is the last one done."""
+        x = np.asarray(x, dtype=float)
+        if self._center is None or not np.array_equal(x, self._center[0]):
+            # each row holds the objective then the constraints at a point
+            values = self._executor.submit(_evaluate_point, x).result()
+            self.batches += 1
+            self._center = (x.copy(), values)
+        return self._center[1]
+
+    def _gradients_at(self, x):
+        """Evaluate the stencil around x unless it is the last one done."""
+        x = np.asarray(x, dtype=float)
+        if self._jacobian is None or not np.array_equal(x, self._jacobian[0]):
+            points, steps = self.stencil(x)
+            if self._center is not None and np.array_equal(x,
+                                                           self._center[0]):
+                center = self._center[1]
+                points = points[1:]
+            else:
+                center = None
+            rows = np.array(list(self._executor.map(_evaluate_point, points)))
+            self.batches += 1
+            if center is None:
+                center, rows = rows[0], rows[1:]
+                self._center = (x.copy(), center)
+            n = len(x)
+            if self.scheme == 'forward':
+                deltas = rows[:n] - center
+            else:
+                deltas = (rows[:n] - rows[n:]) / 2.0
+            # transpose so rows are functions and columns design variables
+            self._jacobian = (x.copy(), (deltas / steps[:, np.newaxis]).T)
+        return self._jacobian[1]
+
+
+def _init_worker(model, preferences):
+    """Build the objective and constraints of a worker's model copy."""
+    _WORKER['objective'] = objective.build_objective(model, preferences)
+    _WORKER['constraints'] = optimize.build_constraint_function(
+        model, preferences)
+
+
+def _evaluate_point(x):
+    """Evaluate the objective and constraints at one stencil point."""
+    value = _WORKER['objective'](x)
+    constraint = _WORKER['constraints']
+    if constraint is None:
+        return np.array([value])
+    return np.concatenate([[value], constraint['fun'](x)])
@@ -0,0 +1,261 @@
+"""
+Recording of every model evaluation, with checkpoint and resume.
+
+A long optimization otherwise keeps nothing but the final design. Wrapping
+the model in a :py:class:`History` records each evaluated design with its
+dependent values, aggregate objective and hard-constraint values. Records
+are kept in growable in-memory arrays and appended to a file every so
+often, so a run that dies loses at most the last few evaluations.
+Reopening the file resumes: recorded designs are answered from memory
+instead of being run again, and :py:meth:`History.best` gives the point
+to warm-start from.
+
+The file holds a text header followed by rows of little-endian float64
+values: the design, then the dependents in preference order, the aggregate
+value and the constraint values. Use :py:func:`load_history` to read it.
+"""
+
+import collections
+import json
+import logging
+import os
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'PHYSPROG-HISTORY 1\n'
+
+HistoryRecords = collections.namedtuple(
+    'HistoryRecords',
+    ['names', 'designs', 'dependents', 'values', 'constraints'])
+
+
+class History(object):
+    """
+    Model wrapper that records every distinct design it evaluates.
+
+    The wrapper follows the array model protocol: ``evaluate(x)`` returns
+    all dependents in preference order and ``dependents`` names them. It
+    also has one method per dependent name, and other attributes are
+    forwarded to the wrapped model, so it can be passed anywhere a model
+    is expected. Dependents of designs the model cannot evaluate are NaN.
+
+    Records are appended to ``path`` (if given) after every
+    ``flush_every`` new evaluations and on :py:meth:`close`. If ``path``
+    already exists, its records are loaded first.
+    """
+
+    def __init__(self, model, preferences, path=None, flush_every=100):
+        """Wrap model, recording dependents named in preferences."""
+        self.model = model
+        self.names = list(preferences)
+        self.dependents = self.names
+        self.path = path
+        self.flush_every = flush_every
+        self._compiled = classfunctions.PreferenceSet(preferences)
+        self._lookup = {}
+        self._data = None
+        self._count = 0
+        self._flushed = 0
+        self._current = None
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        """Return the number of recorded evaluations."""
+        return self._count
+
+    def __enter__(self):
+        """Record within a with block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Write outstanding records at the end of a with block."""
+        self.close()
+
+    @property
+    def design(self):
+        """Return the design of the wrapped model."""
+        return self.model.design
+
+    @design.setter
+    def design(self, val):
+        self.model.design = val
+        self._current = None
+
+    def evaluate(self, x=None):
+        """Return all dependents of the design, from the record if present."""
+        if x is not None:
+            self.design = x
+        if self._current is None:
+            key = tuple(np.asarray(self.design, dtype=float).tolist())
+            row = self._lookup.get(key)
+            if row is None:
+                row = self._record(key)
+            self._current = row
+        return self.records().dependents[self._current].copy()
+
+    def __getattr__(self, name):
+        """Answer dependent requests from the record, forward the rest."""
+        if name in self.__dict__.get('names', ()):
+            return lambda: self._value(name)
+        return getattr(self.__dict__['model'], name)
+
+    def records(self):
+        """Return views of everything recorded so far."""
+        if self._data is None:
+            return _split_records(self.names, 0, np.empty((0, 0)))
+        return _split_records(self.names, self._ndesign(),
+                              self._data[:self._count])
+
+    def best(self):
+        """
+        Return the row of the best recorded design, or None if empty.
+
+        Designs meeting all hard constraints beat those that do not.
+        """
+        if not self._count:
+            return None
+        records = self.records()
+        infeasible = ~np.all(records.constraints >= 0.0, axis=1)
+        return int(np.lexsort((records.values, infeasible))[0])
+
+    def flush(self):
+        """Append records not yet on disk to the file."""
+        if self.path is None or self._flushed == self._count:
+            return
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'ab') as out:
+            if new_file:
+                out.write(self._header())
+            out.write(np.ascontiguousarray(
+                self._data[self._flushed:self._count], dtype='<f8').tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+        LOG.debug('Wrote %d records to %s', self._count - self._flushed,
+                  self.path)
+        self._flushed = self._count
+
+    def close(self):
+        """Write outstanding records."""
+        self.flush()
+
+    def _value(self, name):
+        """Return a dependent of the current design."""
+        value = self.evaluate()[self.names.index(name)]
+        if not np.isfinite(value):
+            raise ValueError('Design {} could not be evaluated'.format(
+                self.design))
+        return value
+
+    def _record(self, key):
+        """Evaluate the wrapped model at a new design and record it."""
+        try:
+            values = np.array(
+                objective.dependent_reader(self.model, self.names)(key))
+        except ValueError:
+            values = np.full(len(self.names), np.nan)
+        aggregate, _contributions = self._compiled.evaluate(values)
+        if not np.all(np.isfinite(values[self._compiled.soft_index])):
+            aggregate = objective.INVALID_PENALTY
+        row = np.concatenate([key, values, [aggregate],
+                              self._constraint_values(values)])
+        self._append(row[np.newaxis, :])
+        self._lookup[key] = self._count - 1
+        if self._count - self._flushed >= self.flush_every:
+            self.flush()
+        return self._count - 1
+
+    def _constraint_values(self, values):
+        """Return each hard constraint, non-negative when it holds."""
+        hard = values[self._compiled.hard_index]
+        lower = hard - self._compiled.lower
+        upper = self._compiled.upper - hard
+        rows = np.column_stack([lower, upper]).ravel()
+        limits = np.column_stack([self._compiled.lower,
+                                  self._compiled.upper]).ravel()
+        return rows[np.isfinite(limits)]
+
+    def _ndesign(self):
+        """Return the number of design variables of each record."""
+        nconstraints = (np.isfinite(self._compiled.lower).sum() +
+                        np.isfinite(self._compiled.upper).sum())
+        return self._data.shape[1] - len(self.names) - 1 - int(nconstraints)
+
+    def _append(self, rows):
+        """Add rows to the store, doubling its capacity when full."""
+        if self._data is None:
+            self._data = np.empty((max(len(rows), 64), rows.shape[1]))
+        elif self._count + len(rows) > len(self._data):
+            capacity = max(2 * len(self._data), self._count + len(rows))
+            grown = np.empty((capacity, self._data.shape[1]))
+            grown[:self._count] = self._data[:self._count]
+            self._data = grown
+        self._data[self._count:self._count + len(rows)] = rows
+        self._count += len(rows)
+
+    def _header(self):
+        """Return the file header describing each record's columns."""
+        return MAGIC + json.dumps({
+            'names': self.names, 'ndesign': self._ndesign(),
+            'ncolumns': self._data.shape[1]}).encode() + b'\n'
+
+    def _load(self, path):
+        """Load the records of an existing file to resume from."""
+        records = load_history(path)
+        if records.names != self.names:
+            raise ValueError('{} records dependents {}, not {}'.format(
+                path, records.names, self.names))
+        self._append(np.column_stack([
+            records.designs, records.dependents, records.values,
+            records.constraints]))
+        self._flushed = self._count
+        # drop a partly written last record so that appends line up
+        header, offset = _read_header(path)
+        os.truncate(path, offset + 8 * header['ncolumns'] * self._count)
+        for row, design in enumerate(records.designs.tolist()):
+            self._lookup[tuple(design)] = row
+        LOG.info('Resuming from %d recorded evaluations in %s',
+                 self._count, path)
+
+
+def load_history(path):
+    """
+    Read the records of a history file into memory-mapped arrays.
+
+    A partly written last record, e.g. from a run killed mid-write, is
+    ignored.
+    """
+    header, offset = _read_header(path)
+    ncolumns = header['ncolumns']
+    nrows = (os.path.getsize(path) - offset) // (8 * ncolumns)
+    if nrows:
+        data = np.memmap(path, dtype='<f8', mode='r', offset=offset,
+                         shape=(nrows, ncolumns))
+    else:
+        data = np.empty((0, ncolumns))
+    return _split_records(header['names'], header['ndesign'], data)
+
+
+def _read_header(path):
+    """Return the header of a history file and where its records start."""
+    with open(path, 'rb') as history:
+        if history.readline() != MAGIC:
+            raise ValueError('{} is not a history file'.format(path))
+        header = json.loads(history.readline().decode())
+        return header, history.tell()
+
+
+def _split_records(names, ndesign, data):
+    """Split rows of record values into the parts of each record."""
+    ndependents = len(names)
+    return HistoryRecords(
+        names=names,
+        designs=data[:, :ndesign],
+        dependents=data[:, ndesign:ndesign + ndependents],
+        values=data[:, ndesign + ndependents],
+        constraints=data[:, ndesign + ndependents + 1:])
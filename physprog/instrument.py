@@ -0,0 +1,138 @@
+"""
+Lightweight instrumentation of optimization runs.
+
+Pass an :py:class:`Instrumentation` to
+:py:func:`physprog.optimize.optimize`,
+:py:func:`physprog.objective.build_objective` or
+:py:func:`physprog.optimize.get_constraints` to count objective and
+constraint calls, time each phase and histogram the preference regions
+each dependent lands in. Runs of the model itself are counted by a model
+wrapped with :py:meth:`Instrumentation.wrap_model`, which
+:py:func:`~physprog.optimize.optimize` does for local optimizations in
+this process. Without one, none of this code runs.
+"""
+
+import collections
+import contextlib
+import logging
+import time
+
+from physprog import classfunctions
+
+LOG = logging.getLogger(__name__)
+
+
+class Instrumentation(object):
+    """
+    Counters, timers and region histograms of one optimization run.
+
+    Counts and accumulated seconds are keyed by phase name, e.g.
+    ``'model'``, ``'classfunctions'``, ``'constraint'`` or
+    ``'minimize'``. Timings use a monotonic clock. Events are sent to
+    ``callback(event, fields)`` if given and logged through ``logger``
+    (set it to None to only use the callback).
+    """
+
+    def __init__(self, callback=None, logger=LOG, level=logging.INFO):
+        """Construct empty instrumentation."""
+        self.callback = callback
+        self.logger = logger
+        self.level = level
+        self.counts = collections.Counter()
+        self.times = collections.Counter()
+        self.regions = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        """Add the time spent in a with block to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] += time.perf_counter() - start
+
+    def wrap(self, func, phase):
+        """Return func, counting and timing each of its calls as phase."""
+        def wrapped(*args, **kwargs):
+            """Call the wrapped function, recording its cost."""
+            self.counts[phase] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[phase] += time.perf_counter() - start
+
+        return wrapped
+
+    def wrap_model(self, model):
+        """Return model, counting each of its runs as ``'model'``."""
+        return _CountedModel(model, self)
+
+    def record_region(self, funcname, region):
+        """Count that dependent funcname landed in a preference region."""
+        if funcname not in self.regions:
+            self.regions[funcname] = [0] * (classfunctions.UNACCEPTABLE + 1)
+        self.regions[funcname][region] += 1
+
+    def summary(self):
+        """Return all counts, times and region histograms."""
+        return {
+            'counts': dict(self.counts),
+            'times': dict(self.times),
+            'regions': {name: list(hist)
+                        for name, hist in self.regions.items()},
+        }
+
+    def emit(self, event, **fields):
+        """Send a structured event to the callback and the log."""
+        if self.callback is not None:
+            self.callback(event, fields)
+        if self.logger is not None and self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, '%s %s', event,
+                ' '.join('{}={}'.format(key, value)
+                         for key, value in sorted(fields.items())),
+                extra={'event': event, 'fields': fields})
+
+
+class _CountedModel(object):
+    """
+    Model wrapper counting the runs of the wrapped model.
+
+    Every ``evaluate`` call counts once, and ``evaluate_many`` once per
+    design, whether the objective, a constraint or the optimizer itself
+    asked for it. Dependents read after a run are not counted, and a
+    cache wrapped around this model only lets its misses through.
+    """
+
+    def __init__(self, model, instrument):
+        """Wrap model, counting its runs in instrument."""
+        self.model = model
+        self.instrument = instrument
+
+    @property
+    def design(self):
+        """Return the design of the wrapped model."""
+        return self.model.design
+
+    @design.setter
+    def design(self, val):
+        self.model.design = val
+
+    def evaluate(self, x=None):
+        """Run the wrapped model at design x."""
+        self.instrument.counts['model'] += 1
+        return self.model.evaluate(x)
+
+    def __getattr__(self, name):
+        """Forward everything else, counting batch evaluations."""
+        attr = getattr(self.__dict__['model'], name)
+        if name != 'evaluate_many':
+            return attr
+        instrument = self.__dict__['instrument']
+
+        def evaluate_many(designs):
+            """Run the wrapped model on many designs at once."""
+            instrument.counts['model'] += len(designs)
+            return attr(designs)
+        return evaluate_many
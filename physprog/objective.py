@@ -7,24 +7,224 @@ used by the optimize module to perform optimization
 but may also be used for any external optimization needs.
 """
 
+import collections
+
+import numpy as np
+
 from physprog import classfunctions
 
+# aggregate value given to designs the model cannot evaluate
+INVALID_PENALTY = 1e3
+
+
+def dependent_indices(model, names):
+    """
+    Find where each named dependent sits in the array a model returns.
+
+    Models may opt in to an array protocol by setting a ``dependents``
+    attribute. Their ``evaluate(x)`` then returns all dependents of design
+    x in one array, and ``dependents`` lists the name of each entry or maps
+    each name to its index. Returns None for models following the usual
+    protocol of one method per dependent.
+    """
+    order = getattr(model, 'dependents', None)
+    if order is None:
+        return None
+    if not hasattr(order, 'keys'):
+        order = {name: i for i, name in enumerate(order)}
+    return np.array([order[name] for name in names], dtype=int)
+
+
+def dependent_reader(model, names):
+    """
+    Build a function returning the values of named dependents at design x.
+
+    Array models (see :py:func:`dependent_indices`) are evaluated once and
+    the values are taken from the returned array. Other models are
+    evaluated and then asked for each dependent by name. Either way, the
+    function raises ValueError for designs the model cannot evaluate,
+    which for array models includes non-finite values.
+    """
+    names = list(names)
+    indices = dependent_indices(model, names)
+
+    if indices is None:
+        def read(x):
+            """Evaluate the model and ask it for each dependent."""
+            model.evaluate(x)
+            return [getattr(model, funcname)() for funcname in names]
+    else:
+        def read(x):
+            """Evaluate the model and pick dependents from its array."""
+            values = np.asarray(model.evaluate(x), dtype=float)[indices]
+            if not np.all(np.isfinite(values)):
+                raise ValueError('Design {} has non-finite dependents'
+                                 ''.format(x))
+            return values.tolist()
+
+    return read
+
+
+def _soft_functions(preferences):
+    """List the names and functions of the soft class functions."""
+    return [(funcname, func) for funcname, func in preferences.items()
+            if issubclass(func.__class__, classfunctions.SmoothClassFunction)]
+
+
+def build_objective(model, preferences, instrument=None):
+    """
+    Build an objective function based on a model and preferences.
+
+    With an ``instrument`` (a :py:class:`physprog.instrument.Instrumentation`)
+    objective calls are counted, reading the dependents (``'model'``) and
+    class function calls are timed and the region of each dependent is
+    recorded. Without one there is no overhead. Model runs are only counted
+    for a model from
+    :py:meth:`~physprog.instrument.Instrumentation.wrap_model`.
+    """
+    if instrument is not None:
+        return _build_instrumented_objective(model, preferences, instrument)
+    soft = _soft_functions(preferences)
+    funcs = [func for _funcname, func in soft]
+    read = dependent_reader(model, [funcname for funcname, _func in soft])
+
+    def objective(x):
+        """Evaluate the aggregate-objective function."""
+        try:
+            # e.g. cost of this design
+            param_vals = read(x)
+        except ValueError:
+            # invalid, throw a big penalty.
+            return INVALID_PENALTY
+        total = 0.0
+        for func, param_val in zip(funcs, param_vals):
+            total += func.evaluate(param_val)  # transformed cost
+        return total
+
+    return objective
+
+
+def _build_instrumented_objective(model, preferences, instrument):
+    """Build an objective function that reports to instrumentation."""
+    soft = _soft_functions(preferences)
+    read = dependent_reader(model, [funcname for funcname, _func in soft])
 
-def build_objective(model, preferences):
-    """Build an objective function based on a model and preferences."""
     def objective(x):
         """Evaluate the aggregate-objective function."""
-        model.evaluate(x)
+        instrument.counts['objective'] += 1
+        try:
+            with instrument.timer('model'):
+                param_vals = read(x)
+        except ValueError:
+            instrument.counts['invalid'] += 1
+            return INVALID_PENALTY
         total = 0.0
-        for funcname, func in preferences.items():
-            if issubclass(func.__class__, classfunctions.SmoothClassFunction):
-                try:
-                    # e.g. cost of this design
-                    param_val = getattr(model, funcname)()
-                except ValueError:
-                    # invalid, throw a big penalty.
-                    return 1e3
-                total += func.evaluate(param_val)  # transformed cost
+        for (funcname, func), param_val in zip(soft, param_vals):
+            with instrument.timer('classfunctions'):
+                total += func.evaluate(param_val)
+            instrument.record_region(funcname, func.which_region(param_val))
         return total
 
     return objective
+
+
+def build_gradient(model, preferences):
+    """
+    Build the gradient of the aggregate objective with respect to the design.
+
+    The model must provide a ``jacobian(x)`` method returning a mapping
+    from each dependent name to its gradient with respect to the design.
+    Analytic slopes of the class functions are chained with it, so the
+    optimizer needs no finite differences.
+    """
+    soft = _soft_functions(preferences)
+    read = dependent_reader(model, [funcname for funcname, _func in soft])
+
+    def gradient(x):
+        """Evaluate the gradient of the aggregate-objective function."""
+        total = np.zeros(len(x))
+        try:
+            param_vals = read(x)
+            jacobian = model.jacobian(x)
+        except ValueError:
+            # the objective is a constant penalty here.
+            return total
+        for (funcname, func), param_val in zip(soft, param_vals):
+            total += func.derivative(param_val) * np.asarray(
+                jacobian[funcname], dtype=float)
+        return total
+
+    return gradient
+
+
+def build_batch_objective(model, preferences):
+    """
+    Build an objective function that scores many designs in one call.
+
+    The returned function takes an (N, n_design) array of designs and
+    returns the N aggregate values. Models with an ``evaluate_many(designs)``
+    method returning a mapping from each dependent name to an array of N
+    values are evaluated in a single call. Other models are evaluated one
+    design at a time.
+
+    Designs the model cannot evaluate get the same penalty as in
+    :py:func:`build_objective`. For vectorized models, these are signaled
+    by non-finite dependent values.
+    """
+    compiled = classfunctions.PreferenceSet(
+        collections.OrderedDict(_soft_functions(preferences)))
+    names = compiled.names
+
+    def objective_many(designs):
+        """Evaluate the aggregate-objective function of each design."""
+        designs = np.atleast_2d(np.asarray(designs, dtype=float))
+        param_vals = dependent_matrix(model, designs, names)
+        total, _contributions = compiled.evaluate(param_vals)
+        total[~np.all(np.isfinite(param_vals), axis=1)] = INVALID_PENALTY
+        return total
+
+    return objective_many
+
+
+def evaluate_designs(model, designs, names):
+    """
+    Evaluate named dependents of many designs into arrays.
+
+    Models with an ``evaluate_many(designs)`` method are evaluated in one
+    call. Others are evaluated one design at a time, and dependents of
+    designs they reject are NaN.
+    """
+    if hasattr(model, 'evaluate_many'):
+        return model.evaluate_many(designs)
+    return _evaluate_each(model, designs, names)
+
+
+def dependent_matrix(model, designs, names):
+    """
+    Evaluate named dependents of many designs into an (N, n_names) array.
+
+    See :py:func:`evaluate_designs`.
+    """
+    dependents = evaluate_designs(model, designs, names)
+    param_vals = np.empty((len(designs), len(names)))
+    for column, funcname in enumerate(names):
+        param_vals[:, column] = dependents[funcname]
+    return param_vals
+
+
+def _evaluate_each(model, designs, names):
+    """
+    Evaluate dependents of a model that only handles one design at a time.
+
+    All dependents of a design the model rejects with a ValueError are NaN.
+    """
+    read = dependent_reader(model, names)
+    dependents = {funcname: np.empty(len(designs)) for funcname in names}
+    for row, x in enumerate(designs):
+        try:
+            param_vals = read(x)
+        except ValueError:
+            param_vals = [np.nan] * len(names)
+        for funcname, param_val in zip(names, param_vals):
+            dependents[funcname][row] = param_val
+    return dependents
@@ -1,66 +1,431 @@
 """Optimize a design according to preferences."""
+import collections
+import concurrent.futures
+import logging
+import time
+
+import numpy as np
 import scipy.optimize
 
+from physprog import caching
 from physprog import classfunctions
+from physprog import history as recorder
 from physprog import objective
-from physprog import plots
 
+LOG = logging.getLogger(__name__)
+
+# outcome of the local optimization from one starting design
+StartResult = collections.namedtuple(
+    'StartResult', ['design', 'value', 'success', 'start'])
+
+
+def optimize(model, preferences, plot=False, cache=False,
+             vectorized_constraints=False, instrument=None,
+             parallel_gradient=None, max_workers=None, history=None,
+             method='local', options=None):
+    """
+    Optimize the given problem to specified preferences.
+
+    The model is left at the optimal design and the scipy result is
+    returned.
+
+    If the model provides a ``jacobian(x)`` method (see
+    :py:func:`physprog.objective.build_gradient`), analytic gradients of
+    the objective and constraints are passed to the optimizer.
+
+    With ``cache`` the model is wrapped in a
+    :py:class:`physprog.caching.CachedModel` shared by the objective and
+    the constraints, so each distinct design is only evaluated once. Pass
+    a ``CachedModel`` instead of ``True`` to control its settings.
+
+    With ``vectorized_constraints`` all hard constraints are handed to the
+    optimizer as one vector-valued function (see :py:func:`get_constraints`).
+
+    With an ``instrument`` (a :py:class:`physprog.instrument.Instrumentation`)
+    objective, class function and constraint calls are counted and timed,
+    and a summary is emitted as an ``'optimize'`` event when done. Runs of
+    the model are counted as ``'model'``, including those the constraints
+    need but not those a cache answers. Runs in worker processes and
+    those of a cache or a :py:class:`physprog.history.History` passed in
+    are not.
+
+    With ``parallel_gradient`` set to ``'forward'`` or ``'central'``, the
+    objective, the hard constraints and their finite-difference gradients
+    all come from one stencil of designs evaluated in up to
+    ``max_workers`` processes (see
+    :py:class:`physprog.finitediff.ParallelDifferences`). An analytic model
+    Jacobian, caching and constraint vectorization do not apply then.
 
-def optimize(model, preferences, plot=False):
-    """Optimize the given problem to specified preferences."""
-    constraints = get_constraints(model, preferences)
+    With ``history``, the path of a history file or a
+    :py:class:`physprog.history.History`, every evaluation is recorded
+    and checkpointed. If the history already has records, the run resumes:
+    it starts from the best recorded design and recorded designs are not
+    evaluated again. Recording does not combine with ``parallel_gradient``.
+
+    ``method`` picks the engine: ``'local'`` for the gradient-based local
+    optimizer described above, a name in :py:data:`OPTIMIZERS` such as
+    ``'differential_evolution'``, or any callable taking the model,
+    preferences and keyword ``options`` and returning a scipy
+    ``OptimizeResult``. The options of the global methods, e.g. their
+    ``bounds``, go in ``options``.
+    """
+    if instrument is not None and method == 'local' and not parallel_gradient:
+        model = instrument.wrap_model(model)
+    recording = history
+    if history is not None:
+        if parallel_gradient:
+            raise ValueError('Evaluations in worker processes cannot be '
+                             'recorded')
+        if not isinstance(history, recorder.History):
+            recording = recorder.History(model, preferences, history)
+        model = recording
+        best = recording.best()
+        if best is not None:
+            model.design = recording.records().designs[best]
+            LOG.info('Warm-starting from the best of %d recorded '
+                     'evaluations', len(recording))
+    if cache is True:
+        model = caching.CachedModel(model, preferences)
+    elif cache:
+        model = cache
     aggregate = objective.build_objective(model, preferences)
     initial_performance = model.evaluate()
-    print('Optimizing design starting at value: {:.2f}\n{}'
-          ''.format(aggregate(model.design), initial_performance))
+    if LOG.isEnabledFor(logging.INFO):
+        LOG.info('Optimizing design starting at value: %.2f\n%s',
+                 aggregate(model.design), initial_performance)
 
-    scipy.optimize.minimize(
-        aggregate,
-        model.design,
-        constraints=constraints,
-        options={'disp': False})
+    if instrument is not None:
+        # the instrument may carry the phase times of earlier runs
+        times_before = instrument.times.copy()
+    start = time.perf_counter()
+    try:
+        if method != 'local':
+            method = OPTIMIZERS.get(method, method)
+            result = method(model, preferences, **(options or {}))
+        elif parallel_gradient:
+            result = _minimize_parallel(model, preferences, parallel_gradient,
+                                        max_workers, instrument)
+        else:
+            result = _minimize(model, preferences, vectorized_constraints,
+                               instrument)
+        elapsed = time.perf_counter() - start
+        final_performance = model.evaluate(result.x)
+    finally:
+        if recording is not None:
+            # a failed run still leaves what it evaluated on disk
+            recording.close()
+    if LOG.isEnabledFor(logging.INFO):
+        LOG.info('Optimal design input: %s\nParams: %s\nValue: %s',
+                 model.design, final_performance, aggregate(model.design))
+
+    if isinstance(model, caching.CachedModel):
+        LOG.info('Model cache: %d hits, %d misses', model.hits, model.misses)
 
-    final_performance = model.evaluate()
-    print('Optimal design input: {}\nParams: {}\nValue: {}'
-          ''.format(model.design, final_performance, aggregate(
-              model.design)))
+    if instrument is not None:
+        instrument.times['minimize'] += elapsed
+        # what is left of this run once our own callbacks are accounted for
+        instrument.times['optimizer'] += elapsed - sum(
+            instrument.times[phase] - times_before[phase] for phase in (
+                'model', 'classfunctions', 'objective', 'constraint',
+                'constraint_jacobian', 'gradient'))
+        instrument.emit('optimize', iterations=result.nit,
+                        success=result.success, **instrument.summary())
 
     if plot:
+        # imported here so headless runs never load matplotlib.
+        from physprog import plots  # pylint: disable=import-outside-toplevel
         plots.plot_optimization_results(
             preferences,
             initial_performance,
             final_performance)
 
+    return result
+
+
+class WhatIfSession(object):
+    """
+    Re-optimize quickly while preference bounds are being edited.
+
+    The model is wrapped in one :py:class:`physprog.caching.CachedModel`
+    of up to ``maxsize`` designs that is kept across runs, since dependent
+    values do not depend on preferences. Each run starts from the optimum
+    of the previous one. Other keyword arguments are passed on to
+    :py:func:`optimize`.
+    """
+
+    def __init__(self, model, preferences, maxsize=10000, **options):
+        """Start a session on a model and built preferences."""
+        self.preferences = preferences
+        self.model = caching.CachedModel(model, preferences, maxsize=maxsize)
+        self.options = options
+        self.result = None
+
+    def optimize(self):
+        """Optimize from the current design with the current preferences."""
+        self.result = optimize(self.model, self.preferences, cache=self.model,
+                               **self.options)
+        return self.result
+
+    def update(self, name, bounds):
+        """Change the bounds of one dependent and re-optimize."""
+        classfunctions.update_bounds(self.preferences, name, bounds)
+        return self.optimize()
+
+
+def _minimize(model, preferences, vectorized_constraints=False,
+              instrument=None, bounds=None):
+    """
+    Run the local optimizer from the current design of the model.
+
+    ``bounds`` optionally gives a (low, high) pair for each design variable.
+    """
+    constraints = get_constraints(
+        model, preferences, vectorized=vectorized_constraints,
+        instrument=instrument)
+    aggregate = objective.build_objective(model, preferences, instrument)
+    if hasattr(model, 'jacobian'):
+        jac = objective.build_gradient(model, preferences)
+        if instrument is not None:
+            jac = instrument.wrap(jac, 'gradient')
+    else:
+        jac = None
+
+    return scipy.optimize.minimize(
+        aggregate,
+        model.design,
+        jac=jac,
+        bounds=bounds,
+        constraints=constraints,
+        options={'disp': False})
+
+
+def _differential_evolution(model, preferences, **options):
+    """Optimize with the population method of physprog.evolution."""
+    # imported here since it is only needed for global optimization.
+    from physprog import evolution  # pylint: disable=import-outside-toplevel
+    return evolution.differential_evolution(model, preferences, **options)
+
+
+# global optimization engines usable as the method of optimize
+OPTIMIZERS = {
+    'differential_evolution': _differential_evolution,
+}
+
 
-def get_constraints(problem, preferences):
+def _minimize_parallel(model, preferences, scheme, max_workers=None,
+                       instrument=None):
+    """Run the local optimizer with gradients from parallel stencils."""
+    # imported here since it is only needed for parallel gradients.
+    from physprog import finitediff  # pylint: disable=import-outside-toplevel
+    with finitediff.ParallelDifferences(model, preferences, scheme,
+                                        max_workers=max_workers) as stencils:
+        aggregate, jac = stencils.objective, stencils.gradient
+        if instrument is not None:
+            aggregate = instrument.wrap(aggregate, 'objective')
+            jac = instrument.wrap(jac, 'gradient')
+        result = scipy.optimize.minimize(
+            aggregate,
+            model.design,
+            jac=jac,
+            constraints=stencils.constraints(),
+            options={'disp': False})
+        if instrument is not None:
+            instrument.counts['stencil'] += stencils.batches
+    return result
+
+
+def multistart(model, preferences, starts=8, bounds=None, sampling='random',
+               max_workers=None, seed=None, cache=False,
+               vectorized_constraints=False):
+    """
+    Optimize from many starting designs in parallel.
+
+    Preference landscapes can have several basins, so the local optimizer
+    is run from each starting design in a process pool. Every worker gets
+    its own copy of the model. ``starts`` is either the number of starting
+    designs to sample within ``bounds`` (see :py:func:`sample_designs`) or
+    an (N, n_design) array of them.
+
+    Returns a :py:class:`StartResult` for every start, best first. The best
+    design is applied back to the model.
+    """
+    if np.ndim(starts) == 0:
+        if bounds is None:
+            raise ValueError('Bounds are needed to sample starting designs.')
+        starts = sample_designs(bounds, starts, sampling, seed)
+    starts = np.atleast_2d(np.asarray(starts, dtype=float))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = [
+            executor.submit(_optimize_from, model, preferences, x0, cache,
+                            vectorized_constraints)
+            for x0 in starts
+        ]
+        results = [future.result() for future in futures]
+
+    # successful runs first, then by aggregate value
+    results.sort(key=lambda result: (not result.success, result.value))
+    best = results[0]
+    LOG.info('Best of %d starts has value %.2f at %s',
+             len(results), best.value, best.design)
+    model.evaluate(best.design)
+    return results
+
+
+def _optimize_from(model, preferences, x0, cache, vectorized_constraints):
+    """Run one start of a multi-start optimization in a worker."""
+    model.design = x0
+    if cache:
+        model = caching.CachedModel(model, preferences)
+    result = _minimize(model, preferences, vectorized_constraints)
+    return StartResult(
+        design=tuple(result.x),
+        value=float(result.fun),
+        success=bool(result.success),
+        start=tuple(x0))
+
+
+def sample_designs(bounds, n, sampling='random', seed=None):
+    """
+    Sample n designs within bounds.
+
+    ``bounds`` gives a (low, high) pair for each design variable.
+    ``sampling`` is ``'random'`` for independent uniform samples or
+    ``'lhs'`` for a Latin hypercube, which puts exactly one sample in each
+    of n equal slices of every design variable.
+    """
+    low, high = np.asarray(bounds, dtype=float).T
+    rng = np.random.RandomState(seed)
+    if sampling == 'random':
+        fractions = rng.uniform(size=(n, len(low)))
+    elif sampling == 'lhs':
+        slices = np.array([rng.permutation(n) for _i in low]).T
+        fractions = (slices + rng.uniform(size=(n, len(low)))) / n
+    else:
+        raise ValueError('Unknown sampling {}'.format(sampling))
+    return low + fractions * (high - low)
+
+
+def get_constraints(problem, preferences, vectorized=False, instrument=None):
     """
     Extract constraints given a set of class functions.
 
     Scipy needs a sequence of dicts describing inequalities that
     will be forced to be >=0.
+
+    Each hard class function normally becomes its own constraint, and
+    :py:class:`~physprog.classfunctions.MustBeInRange` becomes two. With
+    ``vectorized``, all of them are instead folded into a single
+    vector-valued constraint that reads every dependent from one setting of
+    the design (see :py:func:`build_constraint_function`).
+
+    With an ``instrument``, constraint calls are counted and timed.
+    """
+    LOG.debug('Building constraints')
+    if vectorized:
+        constraint = build_constraint_function(problem, preferences)
+        constraints = [constraint] if constraint else []
+    else:
+        constraints = []
+        rows = _constraint_rows(preferences)
+        indices = objective.dependent_indices(
+            problem, [funcname for funcname, _sign, _cutoff in rows])
+        for row, (funcname, sign, cutoff) in enumerate(rows):
+            if indices is None:
+                constraints.append({
+                    'type': 'ineq',
+                    'fun': _constraint,
+                    'args': (problem, funcname, sign, cutoff)
+                })
+            else:
+                constraints.append({
+                    'type': 'ineq',
+                    'fun': _array_constraint,
+                    'args': (problem, funcname, sign, cutoff, indices[row])
+                })
+            if hasattr(problem, 'jacobian'):
+                constraints[-1]['jac'] = _constraint_jacobian
+
+    if instrument is not None:
+        for constraint in constraints:
+            constraint['fun'] = instrument.wrap(constraint['fun'],
+                                                'constraint')
+            if 'jac' in constraint:
+                constraint['jac'] = instrument.wrap(constraint['jac'],
+                                                    'constraint_jacobian')
+    return constraints
+
+
+def build_constraint_function(problem, preferences):
+    """
+    Build one scipy inequality constraint covering all hard class functions.
+
+    The returned dict has a function giving one row per constraint and, if
+    the problem provides a ``jacobian(x)`` method, its Jacobian with one row
+    per constraint. Returns None if there are no hard class functions.
+    """
+    rows = _constraint_rows(preferences)
+    if not rows:
+        return None
+    rownames = [funcname for funcname, _sign, _cutoff in rows]
+    names = list(collections.OrderedDict.fromkeys(rownames))
+    signs = np.array([sign for _funcname, sign, _cutoff in rows])
+    cutoffs = np.array([cutoff for _funcname, _sign, cutoff in rows])
+    indices = objective.dependent_indices(problem, rownames)
+
+    def constraints(x):
+        """Evaluate all hard constraints for optimizer."""
+        if indices is not None:
+            values = np.asarray(problem.evaluate(x), dtype=float)[indices]
+            return signs * (values - cutoffs)
+        problem.design = x
+        values = {funcname: getattr(problem, funcname)() for funcname in names}
+        return signs * (np.array([values[name] for name in rownames]) -
+                        cutoffs)
+
+    def constraints_jacobian(x):
+        """Evaluate the gradients of all hard constraints for optimizer."""
+        jacobian = problem.jacobian(x)
+        return signs[:, np.newaxis] * np.array(
+            [jacobian[name] for name in rownames], dtype=float)
+
+    constraint = {'type': 'ineq', 'fun': constraints}
+    if hasattr(problem, 'jacobian'):
+        constraint['jac'] = constraints_jacobian
+    return constraint
+
+
+def _constraint_rows(preferences):
     """
-    print('Building constraints')
-    constraints = []
+    List the dependent name, sign and cutoff of each hard constraint.
+
+    Each row requires sign * (param - cutoff) >= 0.
+    """
+    rows = []
     for funcname, func in preferences.items():
         if isinstance(func, classfunctions.MustBeAbove):
             # param >= cutoff implies param-cutoff>=0
-            def constraint(x, prob, funcname):
-                """Evaluate a greater-than constraint for optimizer."""
-                prob.design = x
-                return getattr(prob, funcname)() - func.bounds.cutoff  # pylint: disable=cell-var-from-loop
+            rows.append((funcname, 1.0, func.bounds.cutoff))
         elif isinstance(func, classfunctions.MustBeBelow):
             # param <= cutoff implies cutoff - param>=0
-            def constraint(x, prob, funcname):
-                """Evaluate a less-than constraint for optimizer."""
-                prob.design = x
-                return func.bounds.cutoff - getattr(prob, funcname)()  # pylint: disable=cell-var-from-loop
-        else:
-            constraint = None
-
-        if constraint is not None:
-            constraints.append({
-                'type': 'ineq',
-                'fun': constraint,
-                'args': (problem, funcname)
-            })
-    return constraints
+            rows.append((funcname, -1.0, func.bounds.cutoff))
+        elif isinstance(func, classfunctions.MustBeInRange):
+            rows.append((funcname, 1.0, func.lower_bounds.cutoff))
+            rows.append((funcname, -1.0, func.upper_bounds.cutoff))
+    return rows
+
+
+def _constraint(x, prob, funcname, sign, cutoff):
+    """Evaluate a hard constraint for optimizer."""
+    prob.design = x
+    return sign * (getattr(prob, funcname)() - cutoff)
+
+
+def _array_constraint(x, prob, _funcname, sign, cutoff, index):
+    """Evaluate a hard constraint of an array model for optimizer."""
+    return sign * (np.asarray(prob.evaluate(x), dtype=float)[index] - cutoff)
+
+
+def _constraint_jacobian(x, prob, funcname, sign, *_args):
+    """Evaluate the gradient of a hard constraint for optimizer."""
+    return sign * np.asarray(prob.jacobian(x)[funcname], dtype=float)
@@ -0,0 +1,116 @@
+"""
+Robust design under uncertain design variables.
+
+Manufactured designs never match the nominal design exactly. A
+:py:class:`RobustObjective` scores a nominal design by the distribution
+of its aggregate objective over random perturbations within the
+manufacturing tolerances. It can report the mean, a quantile, or the
+probability that some dependent ends up unacceptable.
+
+All perturbed designs of a call are evaluated as one batch (see
+:py:func:`physprog.objective.dependent_matrix`). They are scored with a
+compiled :py:class:`~physprog.classfunctions.PreferenceSet`. The same
+standard perturbations are reused on every call (common random numbers),
+so the objective is deterministic and changes smoothly with the nominal
+design, as gradient-based optimizers need.
+"""
+
+import collections
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+
+RobustStatistics = collections.namedtuple(
+    'RobustStatistics', ['mean', 'quantile', 'unacceptable'])
+
+STATISTICS = ('mean', 'quantile', 'unacceptable')
+
+
+class RobustObjective(object):
+    """
+    Aggregate objective over random perturbations of the design.
+
+    ``tolerances`` gives the standard deviation of each design variable
+    for ``'normal'`` perturbations, or the half-width for ``'uniform'``
+    ones. With ``relative``, they are fractions of each variable's nominal
+    value. ``samples`` perturbations are drawn once from ``seed``. They
+    are evaluated in chunks of at most ``chunksize`` designs, which bounds
+    the memory one call uses.
+
+    Calling the objective returns the chosen ``statistic``:
+
+    * ``'mean'``: the expected aggregate value,
+    * ``'quantile'``: the ``quantile`` of the aggregate values, or
+    * ``'unacceptable'``: the probability that some soft dependent lands in
+      the unacceptable region, a hard constraint fails or the model
+      cannot evaluate the design. This is a step function of the design,
+      so it suits derivative-free optimizers.
+    """
+
+    def __init__(self, model, preferences, tolerances, samples=256,
+                 statistic='mean', quantile=0.9, distribution='normal',
+                 relative=False, seed=0, chunksize=4096):
+        """Draw the perturbations and compile the preferences."""
+        if statistic not in STATISTICS:
+            raise ValueError('Unknown statistic {}'.format(statistic))
+        self.model = model
+        self.names = list(preferences)
+        self.compiled = classfunctions.PreferenceSet(preferences)
+        self.tolerances = np.asarray(tolerances, dtype=float)
+        self.statistic = statistic
+        self.quantile = quantile
+        self.relative = relative
+        self.chunksize = chunksize
+        rng = np.random.RandomState(seed)
+        shape = (samples, len(self.tolerances))
+        if distribution == 'normal':
+            self.perturbations = rng.standard_normal(shape)
+        elif distribution == 'uniform':
+            self.perturbations = rng.uniform(-1.0, 1.0, shape)
+        else:
+            raise ValueError('Unknown distribution {}'.format(distribution))
+
+    def __call__(self, x):
+        """Return the chosen statistic at nominal design x."""
+        return getattr(self.evaluate(x), self.statistic)
+
+    def evaluate(self, x):
+        """Return all statistics at nominal design x."""
+        values, unacceptable = self.sample(x)
+        return RobustStatistics(
+            mean=float(np.mean(values)),
+            quantile=float(np.quantile(values, self.quantile)),
+            unacceptable=float(np.mean(unacceptable)))
+
+    def sample(self, x):
+        """
+        Return the aggregate value of each perturbed design around x.
+
+        Also returns whether each one is unacceptable.
+        """
+        x = np.asarray(x, dtype=float)
+        scale = (self.tolerances * np.abs(x) if self.relative
+                 else self.tolerances)
+        values = np.empty(len(self.perturbations))
+        unacceptable = np.empty(len(self.perturbations), dtype=bool)
+        for start in range(0, len(self.perturbations), self.chunksize):
+            chunk = slice(start, start + self.chunksize)
+            designs = x + scale * self.perturbations[chunk]
+            values[chunk], unacceptable[chunk] = self._score(designs)
+        return values, unacceptable
+
+    def _score(self, designs):
+        """Score one chunk of perturbed designs."""
+        param_vals = objective.dependent_matrix(self.model, designs,
+                                                self.names)
+        total, _contributions = self.compiled.evaluate(param_vals)
+        invalid = ~np.all(np.isfinite(param_vals), axis=1)
+        total[invalid] = objective.INVALID_PENALTY
+        unacceptable = (
+            invalid |
+            np.any(self.compiled.regions(param_vals) ==
+                   classfunctions.UNACCEPTABLE, axis=1) |
+            ~self.compiled.feasible(param_vals))
+        return total, unacceptable
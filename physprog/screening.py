@@ -0,0 +1,212 @@
+"""
+Streaming scoring of large design-of-experiments files.
+
+When dependents of millions of designs are already computed, there is no
+model to run, only class functions to apply. :py:func:`score_file` reads
+the dependent values in fixed-size chunks, scores each chunk with the
+vectorized class functions and writes the results as it goes, so memory
+use depends on the chunk size rather than the file size.
+
+Inputs may be:
+
+* a ``.npy`` file holding a structured array whose field names are the
+  dependent names (memory-mapped),
+* a ``.npy`` file holding a plain 2-D array, with ``columns`` naming its
+  columns (memory-mapped),
+* a directory of one ``<name>.npy`` file per column (memory-mapped), or
+* a ``.csv`` file whose header row names its columns.
+
+Columns are matched to preferences by name. Other columns, such as the
+design variables, are ignored.
+"""
+
+import collections
+import csv
+import heapq
+import itertools
+import logging
+import os
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+
+LOG = logging.getLogger(__name__)
+
+ScreeningResult = collections.namedtuple(
+    'ScreeningResult', ['rows', 'feasible', 'top'])
+
+# one of the best designs: its row in the input and its aggregate value
+Ranked = collections.namedtuple('Ranked', ['row', 'value'])
+
+
+def read_chunks(source, chunksize=100000, columns=None, select=None):
+    """
+    Yield the columns of a design-of-experiments file in chunks.
+
+    Each chunk is a mapping of column name to an array of at most
+    ``chunksize`` values. ``columns`` names the columns of a plain 2-D
+    ``.npy`` file. ``select`` names the columns to read, all by default;
+    other columns may then hold anything, e.g. text IDs in a CSV file.
+    Empty CSV cells read as NaN.
+    """
+    if os.path.isdir(source):
+        arrays = collections.OrderedDict(
+            (os.path.splitext(fname)[0],
+             np.load(os.path.join(source, fname), mmap_mode='r'))
+            for fname in sorted(os.listdir(source))
+            if fname.endswith('.npy'))
+        return _slice_chunks(_selected(arrays, select), chunksize)
+    if source.endswith('.npy'):
+        data = np.load(source, mmap_mode='r')
+        if data.dtype.names:
+            arrays = collections.OrderedDict(
+                (name, data[name]) for name in data.dtype.names)
+        elif columns is None or len(columns) != data.shape[1]:
+            raise ValueError('Name all {} columns of {}'
+                             ''.format(data.shape[1], source))
+        else:
+            arrays = collections.OrderedDict(
+                (name, data[:, i]) for i, name in enumerate(columns))
+        return _slice_chunks(_selected(arrays, select), chunksize)
+    if source.endswith('.csv'):
+        return _csv_chunks(source, chunksize, select)
+    raise ValueError('Unknown design-of-experiments format: {}'.format(source))
+
+
+def _selected(arrays, select):
+    """Keep the selected columns that exist, or all without a selection."""
+    if select is None:
+        return arrays
+    return collections.OrderedDict(
+        (name, values) for name, values in arrays.items() if name in select)
+
+
+def _slice_chunks(arrays, chunksize):
+    """Yield consecutive slices of equally long arrays."""
+    lengths = set(len(values) for values in arrays.values())
+    if len(lengths) > 1:
+        raise ValueError('Columns have different lengths: {}'.format(
+            {name: len(values) for name, values in arrays.items()}))
+    nrows = lengths.pop() if lengths else 0
+    for start in range(0, nrows, chunksize):
+        yield {name: np.asarray(values[start:start + chunksize], dtype=float)
+               for name, values in arrays.items()}
+
+
+def _csv_chunks(source, chunksize, select=None):
+    """Yield chunks of the selected columns of a CSV file with a header."""
+    with open(source, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = [name.strip() for name in next(reader)]
+        wanted = [(i, name) for i, name in enumerate(header)
+                  if select is None or name in select]
+        while True:
+            rows = list(itertools.islice(reader, chunksize))
+            if not rows:
+                return
+            # only the wanted columns need to be numbers
+            yield {name: np.array([row[i].strip() or 'nan' for row in rows],
+                                  dtype=float)
+                   for i, name in wanted}
+
+
+def score_chunk(chunk, preferences):
+    """
+    Score one chunk of dependent values.
+
+    Returns the aggregate objective, the hard-constraint feasibility and
+    the region (soft) or acceptability (all) of each dependent, one value
+    per row. Rows with a non-finite soft dependent get the usual invalid
+    penalty, and rows with a non-finite hard dependent are infeasible.
+    """
+    missing = [name for name in preferences if name not in chunk]
+    if missing:
+        raise ValueError('No column for dependents {}'.format(missing))
+    nrows = len(next(iter(chunk.values())))
+    total = np.zeros(nrows)
+    invalid = np.zeros(nrows, dtype=bool)
+    feasible = np.ones(nrows, dtype=bool)
+    regions = collections.OrderedDict()
+    acceptability = collections.OrderedDict()
+    for name, func in preferences.items():
+        values = chunk[name]
+        if isinstance(func, classfunctions.SmoothClassFunction):
+            invalid |= ~np.isfinite(values)
+            total += func.evaluate_many(values)
+            regions[name] = func.which_region_many(values)
+            acceptability[name] = func.acceptability_many(values)
+        elif isinstance(func, classfunctions.HardClassFunction):
+            acceptability[name] = func.acceptability_many(values)
+            feasible &= acceptability[name] == 1.0
+    total[invalid] = objective.INVALID_PENALTY
+    return total, feasible, regions, acceptability
+
+
+def score_file(source, preferences, output=None, chunksize=100000, top=10,
+               columns=None):
+    """
+    Score every design of a design-of-experiments file in chunks.
+
+    The preferences must already have their splines built. If ``output``
+    is given, a CSV with the row number, aggregate objective, feasibility,
+    soft regions and acceptabilities of each design is written to it one
+    chunk at a time.
+
+    Returns a :py:class:`ScreeningResult` with the number of rows, the
+    number of feasible rows and the ``top`` feasible designs with the
+    lowest aggregate objective as :py:class:`Ranked` tuples, best first.
+    """
+    best = []  # heap of (-value, -row) so the worst kept design is first
+    nrows = 0
+    nfeasible = 0
+    outfile = open(output, 'w') if output else None
+    try:
+        for chunk in read_chunks(source, chunksize, columns,
+                                 select=list(preferences)):
+            total, feasible, regions, acceptability = score_chunk(
+                chunk, preferences)
+            rows = np.arange(nrows, nrows + len(total))
+            if outfile is not None:
+                if not nrows:
+                    outfile.write(','.join(
+                        ['row', 'objective', 'feasible'] +
+                        ['{}_region'.format(name) for name in regions] +
+                        ['{}_acceptability'.format(name)
+                         for name in acceptability]) + '\n')
+                np.savetxt(
+                    outfile,
+                    np.column_stack([rows, total, feasible] +
+                                    list(regions.values()) +
+                                    list(acceptability.values())),
+                    fmt=(['%d', '%.17g', '%d'] + ['%d'] * len(regions) +
+                         ['%.6g'] * len(acceptability)),
+                    delimiter=',')
+            _keep_best(best, rows[feasible], total[feasible], top)
+            nrows += len(total)
+            nfeasible += int(feasible.sum())
+            LOG.debug('Scored %d designs', nrows)
+    finally:
+        if outfile is not None:
+            outfile.close()
+    LOG.info('Scored %d designs, %d feasible', nrows, nfeasible)
+    ranked = sorted((Ranked(int(-row), -value) for value, row in best),
+                    key=lambda item: (item.value, item.row))
+    return ScreeningResult(rows=nrows, feasible=nfeasible, top=ranked)
+
+
+def _keep_best(best, rows, values, top):
+    """Merge the best of a chunk into a bounded heap of the best so far."""
+    if top <= 0 or not len(values):
+        return
+    if len(values) > top:
+        # only a chunk's own top few can enter the overall top
+        keep = np.argpartition(values, top - 1)[:top]
+        rows, values = rows[keep], values[keep]
+    for row, value in zip(rows.tolist(), values.tolist()):
+        item = (-value, -row)
+        if len(best) < top:
+            heapq.heappush(best, item)
+        elif item > best[0]:
+            heapq.heapreplace(best, item)
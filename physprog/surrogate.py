@@ -0,0 +1,258 @@
+"""
+Surrogate-assisted optimization for expensive models.
+
+When each model evaluation takes minutes, even a gradient-based run is
+too slow. Instead, cheap response surfaces are fit to sampled values of
+each dependent, and the aggregate objective is optimized over them within
+a trust region. Each candidate is checked against the true model, the
+trust region grows or shrinks depending on how well the surfaces predicted
+the improvement, and the surfaces are refit with the new sample.
+
+The aggregate objective and hard constraints always go through the real
+class functions. Only the dependent values are approximated.
+"""
+
+import collections
+import logging
+
+import numpy as np
+import scipy.optimize
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import optimize
+
+LOG = logging.getLogger(__name__)
+
+SurrogateResult = collections.namedtuple(
+    'SurrogateResult',
+    ['design', 'value', 'feasible', 'evaluations', 'designs', 'values'])
+
+
+class QuadraticSurface(object):
+    """Least-squares quadratic response surface."""
+
+    def __init__(self):
+        """Construct an unfitted surface."""
+        self.coeffs = None
+
+    def fit(self, x, y):
+        """Fit the surface to values y at points x (one per row)."""
+        self.coeffs = np.linalg.lstsq(self._basis(x), y, rcond=None)[0]
+        return self
+
+    def predict(self, x):
+        """Predict values at points x (one per row)."""
+        return self._basis(x).dot(self.coeffs)
+
+    @staticmethod
+    def _basis(x):
+        """Return constant, linear and quadratic terms of each point."""
+        x = np.atleast_2d(x)
+        rows, cols = np.triu_indices(x.shape[1])
+        return np.hstack([np.ones((len(x), 1)), x, x[:, rows] * x[:, cols]])
+
+
+class RBFSurface(object):
+    """Cubic radial basis function interpolant with a linear tail."""
+
+    def __init__(self):
+        """Construct an unfitted surface."""
+        self.centers = None
+        self.weights = None
+        self.tail = None
+
+    def fit(self, x, y):
+        """Fit the surface to values y at points x (one per row)."""
+        x = np.atleast_2d(x)
+        npoints, ndim = x.shape
+        poly = np.hstack([np.ones((npoints, 1)), x])
+        system = np.zeros((npoints + ndim + 1, npoints + ndim + 1))
+        system[:npoints, :npoints] = self._kernel(x, x)
+        system[:npoints, npoints:] = poly
+        system[npoints:, :npoints] = poly.T
+        rhs = np.concatenate([y, np.zeros(ndim + 1)])
+        # least squares copes with repeated or collinear points
+        solution = np.linalg.lstsq(system, rhs, rcond=None)[0]
+        self.centers = x
+        self.weights = solution[:npoints]
+        self.tail = solution[npoints:]
+        return self
+
+    def predict(self, x):
+        """Predict values at points x (one per row)."""
+        x = np.atleast_2d(x)
+        return (self._kernel(x, self.centers).dot(self.weights) +
+                self.tail[0] + x.dot(self.tail[1:]))
+
+    @staticmethod
+    def _kernel(x, centers):
+        """Evaluate the cubic kernel between points and centers."""
+        distances = np.sqrt(
+            ((x[:, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2).sum(-1))
+        return distances ** 3
+
+
+SURFACES = {'quadratic': QuadraticSurface, 'rbf': RBFSurface}
+
+# one true model evaluation. dependents is None for invalid designs.
+_Sample = collections.namedtuple(
+    '_Sample', ['design', 'dependents', 'value', 'feasible'])
+
+
+class SurrogateModel(object):
+    """
+    Model that predicts dependents from fitted response surfaces.
+
+    It follows the usual model protocol (``design``, ``evaluate(x)`` and
+    one method per dependent) as well as ``evaluate_many``, so it can be
+    passed to :py:mod:`physprog.objective` and
+    :py:func:`physprog.optimize.get_constraints` like the true model.
+    Surfaces work in coordinates scaled so that the design bounds map to
+    the unit cube.
+    """
+
+    def __init__(self, surfaces, bounds):
+        """Wrap a mapping of dependent name to fitted surface."""
+        self.surfaces = surfaces
+        self.low, self.high = np.asarray(bounds, dtype=float).T
+        self.design = (self.low + self.high) / 2.0
+
+    def evaluate(self, x=None):
+        """Predict all dependents of a design."""
+        if x is not None:
+            self.design = x
+        return [getattr(self, name)() for name in self.surfaces]
+
+    def evaluate_many(self, designs):
+        """Predict all dependents of many designs at once."""
+        scaled = self.scale(designs)
+        return {name: surface.predict(scaled)
+                for name, surface in self.surfaces.items()}
+
+    def scale(self, x):
+        """Map designs into the unit cube of the bounds."""
+        return (np.asarray(x, dtype=float) - self.low) / (self.high - self.low)
+
+    def __getattr__(self, name):
+        """Predict a dependent of the current design."""
+        surfaces = self.__dict__.get('surfaces', {})
+        if name in surfaces:
+            return lambda: float(surfaces[name].predict(
+                self.scale(self.design))[0])
+        raise AttributeError(name)
+
+
+def optimize_surrogate(model, preferences, bounds, max_evaluations=50,
+                       initial_samples=None, surface='rbf', radius=0.25,
+                       min_radius=1e-3, seed=None):
+    """
+    Optimize an expensive model through response surfaces.
+
+    ``bounds`` gives a (low, high) pair for each design variable. A Latin
+    hypercube of ``initial_samples`` designs (by default two per design
+    variable plus one) and the model's current design are evaluated first.
+    Then at most ``max_evaluations`` true evaluations are spent in total.
+    ``radius`` is the initial trust region half-width as a fraction of the
+    bounds. The search stops early once it shrinks below ``min_radius``.
+    ``surface`` is ``'rbf'`` or ``'quadratic'``.
+
+    Returns a :py:class:`SurrogateResult` with the best design found, its
+    true aggregate value, whether it meets the hard constraints, the number
+    of true evaluations and every evaluated design and its value. The
+    model's design is set to the best one, which is not evaluated again.
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    ndim = len(bounds)
+    names = list(preferences)
+    if initial_samples is None:
+        initial_samples = 2 * ndim + 1
+    designs = [np.asarray(model.design, dtype=float)]
+    designs.extend(optimize.sample_designs(bounds, initial_samples, 'lhs',
+                                           seed))
+    designs = designs[:max_evaluations]
+
+    samples = []
+    for x in designs:
+        samples.append(_evaluate_true(model, preferences, names, x))
+
+    best = _best(samples)
+    while len(samples) < max_evaluations and radius >= min_radius:
+        surrogate = _fit(samples, names, bounds, SURFACES[surface])
+        center = best.design
+        lower = np.maximum(bounds[:, 0],
+                           center - radius * (bounds[:, 1] - bounds[:, 0]))
+        upper = np.minimum(bounds[:, 1],
+                           center + radius * (bounds[:, 1] - bounds[:, 0]))
+        aggregate = objective.build_objective(surrogate, preferences)
+        result = scipy.optimize.minimize(
+            aggregate, center, bounds=list(zip(lower, upper)),
+            constraints=optimize.get_constraints(surrogate, preferences),
+            method='SLSQP', options={'disp': False})
+        candidate = np.clip(result.x, lower, upper)
+
+        sample = _evaluate_true(model, preferences, names, candidate)
+        samples.append(sample)
+        predicted = aggregate(center) - aggregate(candidate)
+        actual = best.value - sample.value
+        ratio = actual / predicted if predicted > 0 else -1.0
+        if _better(sample, best):
+            best = sample
+        if ratio > 0.75 and np.any(
+                np.isclose(candidate, lower) | np.isclose(candidate, upper)):
+            radius = min(2.0 * radius, 1.0)
+        elif ratio < 0.25:
+            radius /= 2.0
+        LOG.debug('Surrogate step ratio %.2f, radius now %.4f', ratio, radius)
+
+    LOG.info('Surrogate optimization used %d model evaluations, best value '
+             '%.4f', len(samples), best.value)
+    model.design = best.design
+    return SurrogateResult(
+        design=tuple(best.design), value=best.value, feasible=best.feasible,
+        evaluations=len(samples),
+        designs=np.array([sample.design for sample in samples]),
+        values=np.array([sample.value for sample in samples]))
+
+
+def _evaluate_true(model, preferences, names, x):
+    """Evaluate the true model and score the design with class functions."""
+    try:
+        dependents = dict(zip(
+            names, objective.dependent_reader(model, names)(x)))
+    except ValueError:
+        return _Sample(x, None, objective.INVALID_PENALTY, False)
+    value = 0.0
+    feasible = True
+    for name, func in preferences.items():
+        if isinstance(func, classfunctions.SmoothClassFunction):
+            value += func.evaluate(dependents[name])
+        elif hasattr(func, 'acceptability'):
+            feasible = feasible and func.acceptability(dependents[name]) == 1.0
+    return _Sample(x, dependents, value, feasible)
+
+
+def _better(sample, best):
+    """Whether a sample beats the best so far, preferring feasible ones."""
+    return ((not sample.feasible, sample.value) <
+            (not best.feasible, best.value))
+
+
+def _best(samples):
+    """Return the best sample."""
+    best = samples[0]
+    for sample in samples[1:]:
+        if _better(sample, best):
+            best = sample
+    return best
+
+
+def _fit(samples, names, bounds, surface_class):
+    """Fit a surface to each dependent of the valid samples."""
+    valid = [sample for sample in samples if sample.dependents is not None]
+    surrogate = SurrogateModel({}, bounds)
+    scaled = surrogate.scale([sample.design for sample in valid])
+    for name in names:
+        values = np.array([sample.dependents[name] for sample in valid])
+        surrogate.surfaces[name] = surface_class().fit(scaled, values)
+    return surrogate
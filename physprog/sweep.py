@@ -0,0 +1,242 @@
+"""
+Sweeps over preference variants to explore trade-offs.
+
+Shifting the bounds of some dependents, e.g. tightening ``cost`` while
+relaxing ``mass``, and optimizing again shows what one dependent costs in
+terms of the others. :py:func:`sweep` does this for a list of bound
+variants, such as a :py:func:`grid` of scale factors. Each variant is
+derived from the built preferences with
+:py:func:`~physprog.classfunctions.update_bounds`, so only the class
+functions that need it are rebuilt.
+
+The optimizations run in a process pool. Once a sweep point finishes, the
+nearest point not yet started is started from its optimum, since nearby
+preferences tend to have nearby optima. Results are appended to a JSON
+lines file as they come in, and the non-dominated (Pareto) set of
+dependent outcomes is collected at the end.
+"""
+
+import collections
+import concurrent.futures
+import copy
+import itertools
+import json
+import logging
+import os
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import optimize
+
+LOG = logging.getLogger(__name__)
+
+# optimum of the preferences of one sweep point
+SweepPoint = collections.namedtuple(
+    'SweepPoint', ['index', 'variant', 'design', 'dependents', 'value',
+                   'success', 'feasible', 'start'])
+
+SweepResult = collections.namedtuple('SweepResult', ['points', 'pareto'])
+
+# total hard-constraint violation still counted as feasible, since the
+# optimizer only meets constraints to within its own tolerance
+FEASIBILITY_TOLERANCE = 1e-6
+
+
+def scale_bounds(bounds, factor):
+    """Multiply all bounds of a class function, or of a pair, by factor."""
+    if isinstance(bounds, tuple) and not hasattr(bounds, '_fields'):
+        return tuple(scale_bounds(side, factor) for side in bounds)
+    return bounds.__class__(*[bound * factor for bound in bounds])
+
+
+def grid(preferences, factors):
+    """
+    Build the variants of a grid of bound scale factors.
+
+    ``factors`` maps dependent names to the factors to try for each. All
+    bounds of a dependent are multiplied by its factor, so a factor below 1
+    tightens a smaller-is-better dependent with positive bounds. Returns
+    one mapping of name to new bounds per combination of factors.
+    """
+    names = list(factors)
+    return [
+        {name: scale_bounds(_bounds_of(preferences[name]), factor)
+         for name, factor in zip(names, combination)}
+        for combination in itertools.product(*[factors[name]
+                                               for name in names])]
+
+
+def build_variant(preferences, variant):
+    """Return a copy of built preferences with the bounds of variant."""
+    funcs = copy.deepcopy(preferences)
+    for name, bounds in variant.items():
+        classfunctions.update_bounds(funcs, name, bounds)
+    return funcs
+
+
+def sweep(model, preferences, variants, max_workers=None, output=None,
+          cache=False, vectorized_constraints=False):
+    """
+    Optimize the model for every variant of the built preferences.
+
+    ``variants`` is a sequence of mappings of dependent name to new bounds,
+    e.g. from :py:func:`grid`. Up to ``max_workers`` optimizations run at
+    once. The first ones start from the model's design at variants spread
+    over the sweep, and each later one from the optimum of the nearest
+    finished variant. With ``output``, each finished point is appended to
+    that JSON lines file.
+
+    Returns a :py:class:`SweepResult` with a :py:class:`SweepPoint` per
+    variant, in order, and the indices of the Pareto set. A successful,
+    feasible point is in that set unless another one has every soft
+    dependent at least as good and one better.
+    """
+    variants = list(variants)
+    if not variants:
+        return SweepResult([], [])
+    names = list(preferences)
+    coordinates = _coordinates(preferences, variants)
+    nworkers = min(max_workers or os.cpu_count() or 1, len(variants))
+    x0 = tuple(model.design)
+    points = [None] * len(variants)
+    pending = set(range(len(variants)))
+
+    with concurrent.futures.ProcessPoolExecutor(nworkers) as executor:
+        running = {}
+
+        def submit(index, start):
+            """Start optimizing one variant from a design."""
+            pending.discard(index)
+            funcs = build_variant(preferences, variants[index])
+            running[executor.submit(
+                _optimize_point, model, funcs, start, cache,
+                vectorized_constraints)] = index
+
+        for index in _spread(coordinates, nworkers):
+            submit(index, x0)
+        while running:
+            done, _running = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                design, dependents, value, success, feasible, start = (
+                    future.result())
+                points[index] = SweepPoint(
+                    index, variants[index], design,
+                    collections.OrderedDict(zip(names, dependents)), value,
+                    success, feasible, start)
+                LOG.info('Sweep point %d of %d has value %.4f', index + 1,
+                         len(variants), value)
+                if output is not None:
+                    _write_point(output, points[index])
+                if pending:
+                    submit(_nearest(coordinates, pending, index), design)
+
+    return SweepResult(points, _pareto_points(preferences, points))
+
+
+def pareto_front(outcomes):
+    """
+    Flag the non-dominated rows of an (N, n) array, smaller being better.
+
+    A row is dominated if another one is at most as large in every column
+    and smaller in at least one.
+    """
+    outcomes = np.asarray(outcomes, dtype=float)
+    # entry [i, j] compares row i against row j
+    no_worse = np.all(outcomes[:, np.newaxis, :] >= outcomes[np.newaxis, :, :],
+                      axis=2)
+    worse = np.any(outcomes[:, np.newaxis, :] > outcomes[np.newaxis, :, :],
+                   axis=2)
+    return ~np.any(no_worse & worse, axis=1)
+
+
+def _optimize_point(model, preferences, x0, cache, vectorized_constraints):
+    """Optimize one sweep point in a worker."""
+    result = optimize._optimize_from(  # pylint: disable=protected-access
+        model, preferences, x0, cache, vectorized_constraints)
+    try:
+        values = objective.dependent_reader(model, preferences)(result.design)
+    except ValueError:
+        values = [np.nan] * len(preferences)
+    violation = classfunctions.PreferenceSet(preferences).violation(
+        np.array(values))
+    feasible = bool(violation <= FEASIBILITY_TOLERANCE)
+    return (result.design, values, result.value, result.success, feasible,
+            result.start)
+
+
+def _bounds_of(func):
+    """Return the bounds of a class function as update_bounds takes them."""
+    if isinstance(func, classfunctions.TwoSidedFunction):
+        return func.lower_bounds, func.upper_bounds
+    return func.bounds
+
+
+def _coordinates(preferences, variants):
+    """Place each variant by the relative change of its bounds."""
+    names = sorted(set().union(*variants)) if variants else []
+    base = {name: np.ravel(np.array(_bounds_of(preferences[name]),
+                                    dtype=float)) for name in names}
+    scale = {name: np.where(base[name] == 0.0, 1.0, np.abs(base[name]))
+             for name in names}
+    # the leading zero keeps variants that change nothing comparable
+    return np.array([
+        np.concatenate([[0.0]] + [
+            (np.ravel(np.array(variant[name], dtype=float)) - base[name]) /
+            scale[name] if name in variant else np.zeros(len(base[name]))
+            for name in names])
+        for variant in variants])
+
+
+def _spread(coordinates, count):
+    """Pick count variants far apart, starting nearest the preferences."""
+    chosen = [int(np.argmin(np.linalg.norm(coordinates, axis=1)))]
+    distance = np.linalg.norm(coordinates - coordinates[chosen[0]], axis=1)
+    while len(chosen) < count:
+        chosen.append(int(np.argmax(distance)))
+        distance = np.minimum(distance, np.linalg.norm(
+            coordinates - coordinates[chosen[-1]], axis=1))
+    return chosen
+
+
+def _nearest(coordinates, candidates, index):
+    """Return the candidate variant nearest to variant index."""
+    candidates = sorted(candidates)
+    distance = np.linalg.norm(coordinates[candidates] - coordinates[index],
+                              axis=1)
+    return candidates[int(np.argmin(distance))]
+
+
+def _pareto_points(preferences, points):
+    """Return the indices of the Pareto set of successful feasible points."""
+    compiled = classfunctions.PreferenceSet(preferences)
+    candidates = [point for point in points
+                  if point.success and point.feasible]
+    if not candidates:
+        return []
+    # flip larger-is-better dependents so that smaller is always better
+    outcomes = (np.array([list(point.dependents.values())
+                          for point in candidates])[:, compiled.soft_index] *
+                compiled.orientation)
+    return [point.index for point, front
+            in zip(candidates, pareto_front(outcomes)) if front]
+
+
+def _write_point(path, point):
+    """Append one finished sweep point to a JSON lines file."""
+    record = {
+        'index': point.index,
+        'variant': {name: np.array(bounds, dtype=float).tolist()
+                    for name, bounds in point.variant.items()},
+        'design': list(point.design),
+        'dependents': dict(point.dependents),
+        'value': point.value,
+        'success': point.success,
+        'feasible': point.feasible,
+        'start': list(point.start),
+    }
+    with open(path, 'a') as out:
+        out.write(json.dumps(record) + '\n')
@@ -0,0 +1,145 @@
+"""Unit tests for concurrent evaluation of simulator-backed models."""
+# pylint: disable=invalid-name,missing-docstring
+import asyncio
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from physprog import asyncmodel
+from physprog import classfunctions
+from physprog import objective
+from physprog.tests.test_objective import sample_designs
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+NAMES = ('frequency', 'cost', 'width', 'length', 'mass', 'semiheight')
+DELAY = 0.1  # seconds each stand-in simulation takes
+
+
+def simulate(x):
+    """Dependents of the sample beam, as an external simulator reports them."""
+    beam = SampleProblemBeam()
+    beam.design = x
+    return {name: getattr(beam, name)() for name in NAMES}
+
+
+class AsyncSimulator(object):
+    """Stand-in for a simulator awaited through asyncio."""
+
+    async def evaluate(self, x):
+        await asyncio.sleep(DELAY * x[0] / 0.3)  # slower for thicker layers
+        return simulate(x)
+
+
+class BlockingSimulator(object):
+    """Stand-in for a simulator that blocks its thread."""
+
+    def evaluate(self, x):
+        time.sleep(DELAY)
+        return simulate(x)
+
+
+class StuckSimulator(object):
+    """Stand-in for a blocking simulator that hangs on some designs."""
+
+    def evaluate(self, x):
+        time.sleep(DELAY if x[0] else 20 * DELAY)
+        return simulate(x)
+
+
+class HungSimulator(object):
+    """Stand-in for a blocking simulator that outlives every timeout."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+
+    def evaluate(self, x):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(3 * DELAY)
+        with self.lock:
+            self.running -= 1
+        return simulate(x)
+
+
+class TestConcurrentModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.designs = sample_designs(8)
+        scalar = objective.build_objective(SampleProblemBeam(), self.prefs)
+        self.expected = [scalar(x) for x in self.designs]
+
+    def check_batch(self, simulator):
+        model = asyncmodel.ConcurrentModel(simulator, NAMES, max_concurrency=8)
+        batch = objective.build_batch_objective(model, self.prefs)
+        start = time.perf_counter()
+        values = batch(self.designs)
+        elapsed = time.perf_counter() - start
+        np.testing.assert_allclose(values, self.expected, rtol=1e-12)
+        # all eight ran at once rather than one after another
+        self.assertLess(elapsed, 4 * DELAY)
+
+    def test_async_batch(self):
+        self.check_batch(AsyncSimulator())
+
+    def test_blocking_batch(self):
+        self.check_batch(BlockingSimulator())
+
+    def test_concurrency_limit(self):
+        model = asyncmodel.ConcurrentModel(BlockingSimulator(), NAMES,
+                                           max_concurrency=2)
+        start = time.perf_counter()
+        model.evaluate_many(self.designs[:4])
+        self.assertGreater(time.perf_counter() - start, 2 * DELAY)
+
+    def test_single_design_protocol(self):
+        model = asyncmodel.ConcurrentModel(AsyncSimulator(), NAMES)
+        scalar = objective.build_objective(model, self.prefs)
+        self.assertAlmostEqual(scalar(self.designs[0]), self.expected[0])
+
+    def test_timeout(self):
+        model = asyncmodel.ConcurrentModel(AsyncSimulator(), NAMES,
+                                           timeout=DELAY / 2)
+        with self.assertLogs('physprog.asyncmodel', 'WARNING'):
+            dependents = model.evaluate_many(self.designs[:2])
+        self.assertTrue(np.isnan(dependents['cost']).all())
+        with self.assertLogs('physprog.asyncmodel', 'WARNING'):
+            model.evaluate(self.designs[0])
+        with self.assertRaises(ValueError):
+            model.cost()
+
+    def test_timeout_excludes_waiting(self):
+        model = asyncmodel.ConcurrentModel(StuckSimulator(), NAMES,
+                                           max_concurrency=1,
+                                           timeout=4 * DELAY)
+        designs = self.designs[:4].copy()
+        designs[0, 0] = 0.0  # stuck
+        with self.assertLogs('physprog.asyncmodel', 'WARNING'):
+            dependents = model.evaluate_many(designs)
+        self.assertTrue(np.isnan(dependents['cost'][0]))
+        np.testing.assert_allclose(
+            dependents['cost'][1:],
+            [simulate(x)['cost'] for x in designs[1:]])
+
+    def test_hung_calls_bounded(self):
+        simulator = HungSimulator()
+        model = asyncmodel.ConcurrentModel(simulator, NAMES,
+                                           max_concurrency=2,
+                                           timeout=DELAY / 2)
+        for _batch in range(2):
+            with self.assertLogs('physprog.asyncmodel', 'WARNING'):
+                model.evaluate_many(self.designs[:4])
+        # calls that timed out still hold their threads
+        self.assertEqual(simulator.most, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
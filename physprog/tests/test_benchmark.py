@@ -0,0 +1,40 @@
+"""Smoke tests for the benchmark suite."""
+# pylint: disable=invalid-name,missing-docstring
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from physprog import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_quick_run(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            output = os.path.join(tmpdir, 'results.json')
+            benchmark.main(['--quick', '--output', output])
+            with open(output) as results:
+                report = json.load(results)
+        finally:
+            shutil.rmtree(tmpdir)
+        names = {record['name'] for record in report['results']}
+        self.assertEqual(names, set(benchmark.BENCHMARKS))
+        for record in report['results']:
+            if 'seconds' in record:
+                self.assertGreater(record['seconds'], 0.0)
+        runs = {record['cache']: record['model_runs']
+                for record in report['results']
+                if record['name'] == 'sample_optimization'}
+        # the cache saves the runs the constraints would make
+        self.assertLess(runs[True], runs[False])
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(SystemExit):
+            benchmark.main(['nonsense'])
+
+
+if __name__ == '__main__':
+    unittest.main()
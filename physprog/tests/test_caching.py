@@ -0,0 +1,85 @@
+"""Unit tests for memoized model evaluation."""
+# pylint: disable=invalid-name,missing-docstring
+import unittest
+
+from physprog import caching
+from physprog import classfunctions
+from physprog import optimize
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class CountingBeam(SampleProblemBeam):
+    """Sample beam that counts how often it is evaluated."""
+
+    def __init__(self):
+        SampleProblemBeam.__init__(self)
+        self.calls = 0
+
+    def evaluate(self, x=None):
+        self.calls += 1
+        return SampleProblemBeam.evaluate(self, x)
+
+
+class TestCachedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.beam = CountingBeam()
+        self.model = caching.CachedModel(self.beam, ['cost', 'mass'])
+        self.x = list(self.beam.design)
+
+    def test_hits_and_misses(self):
+        cost = self.model.evaluate(self.x)[1]
+        self.model.design = self.x
+        self.assertEqual(self.model.cost(), cost)
+        self.assertAlmostEqual(self.model.mass(), 2230.0)
+        self.assertEqual(self.beam.calls, 1)
+        self.assertEqual(self.model.stats(),
+                         caching.CacheStats(hits=2, misses=1, size=1))
+
+    def test_forwards_other_attributes(self):
+        self.assertEqual(self.model.width(), self.beam.width())
+        self.assertEqual(self.model.E1, self.beam.E1)
+
+    def test_tolerance(self):
+        self.model.tolerance = 1e-6
+        self.model.evaluate(self.x)
+        self.model.evaluate([xi + 1e-9 for xi in self.x])
+        self.assertEqual(self.beam.calls, 1)
+        self.model.evaluate([xi + 1e-3 for xi in self.x])
+        self.assertEqual(self.beam.calls, 2)
+
+    def test_lru_eviction(self):
+        self.model.maxsize = 2
+        other = [xi * 1.01 for xi in self.x]
+        third = [xi * 1.02 for xi in self.x]
+        self.model.evaluate(self.x)
+        self.model.evaluate(other)
+        self.model.evaluate(self.x)  # most recently used now
+        self.model.evaluate(third)  # evicts other
+        self.model.evaluate(self.x)
+        self.assertEqual(self.beam.calls, 3)
+        self.model.evaluate(other)
+        self.assertEqual(self.beam.calls, 4)
+
+    def test_invalid_design(self):
+        self.x[:3] = [0.0, 0.35, 0.3]
+        for _i in range(2):
+            with self.assertRaises(ValueError):
+                self.model.evaluate(self.x)
+        self.assertEqual(self.beam.calls, 1)
+
+
+class TestCachedOptimization(unittest.TestCase):
+
+    def test_fewer_model_calls(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        plain = CountingBeam()
+        optimize.optimize(plain, prefs)
+        cached = CountingBeam()
+        optimize.optimize(cached, prefs, cache=True)
+        self.assertLess(cached.calls, plain.calls)
+        self.assertAlmostEqual(cached.cost(), plain.cost())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,25 @@
 """Unit tests for class functions."""
 # pylint: disable=invalid-name,missing-docstring
+import collections
 import unittest
 
+import numpy as np
 
 from physprog import classfunctions
 
 
+def check_evaluate_many(func, g):
+    """Compare batch against scalar evaluation of a built class function."""
+    expected = [func.evaluate(gi) for gi in g]
+    values = func.evaluate_many(g)
+    # the scalar exponential comes from math.exp, which may differ from
+    # np.exp in the last bit
+    awesome = func.which_region_many(g) == classfunctions.AWESOME
+    np.testing.assert_allclose(values, expected, rtol=1e-15, atol=0)
+    np.testing.assert_array_equal(values[~awesome],
+                                  np.array(expected)[~awesome])
+
+
 class TestSmallerBetter(unittest.TestCase):
 
     def setUp(self):
@@ -17,6 +31,45 @@ class TestSmallerBetter(unittest.TestCase):
         self.assertEqual(self.sb.which_region(35), 3)
         self.assertIs(self.sb.which_region(55), 5)
 
+    def test_which_region_many(self):
+        g = np.array([0, 10, 15, 20, 35, 50, 55, np.nan])
+        expected = [self.sb.which_region(gi) for gi in g]
+        np.testing.assert_array_equal(self.sb.which_region_many(g), expected)
+
+    def test_evaluate_many(self):
+        self.sb.build_splines(1)
+        g = np.concatenate([np.linspace(-10, 60, 1001), self.bounds])
+        check_evaluate_many(self.sb, g)
+        self.assertEqual(self.sb.evaluate_many(g.reshape(-1, 2)).shape,
+                         (g.size // 2, 2))
+        # plain floats stay plain floats on the scalar path
+        self.assertIs(type(self.sb.evaluate(5.0)), float)
+        self.assertIs(type(self.sb.derivative(5.0)), float)
+
+    def test_derivative(self):
+        self.sb.build_splines(1)
+        # stay clear of bounds, where the slope may jump
+        g = np.array([5.0, 12.0, 26.0, 33.3, 47.0, 58.0])
+        step = 1e-6
+        expected = (self.sb.evaluate_many(g + step) -
+                    self.sb.evaluate_many(g - step)) / (2 * step)
+        slopes = self.sb.derivative_many(g)
+        np.testing.assert_allclose(slopes, expected, rtol=1e-5)
+        np.testing.assert_array_equal(
+            slopes, [self.sb.derivative(gi) for gi in g])
+
+    def test_spline_table(self):
+        self.assertIsNone(self.sb.table)
+        self.sb.build_splines(1)
+        table = self.sb.table
+        for i in range(1, len(self.bounds)):
+            np.testing.assert_array_equal(
+                table.coeffs[i], self.sb.evaluate_spline_coeffs(i))
+        np.testing.assert_array_equal(table.widths[1:], [10] * 4)
+        np.testing.assert_array_equal(table.lefts[1:], self.bounds[:-1])
+        with self.assertRaises(ValueError):
+            table.coeffs[1, 0] = 0.0
+
 
 class TestLargerBetter(unittest.TestCase):
 
@@ -28,6 +81,208 @@ class TestLargerBetter(unittest.TestCase):
         self.assertEqual(self.lb.which_region(55), 0)
         self.assertEqual(self.lb.which_region(35), 2)
 
+    def test_which_region_many(self):
+        g = np.array([55, 50, 45, 40, 35, 10, 5, np.nan])
+        expected = [self.lb.which_region(gi) for gi in g]
+        np.testing.assert_array_equal(self.lb.which_region_many(g), expected)
+
+    def test_evaluate_many(self):
+        self.lb.build_splines(1)
+        g = np.concatenate([np.linspace(0, 60, 1001), self.bounds])
+        check_evaluate_many(self.lb, g)
+
+    def test_derivative(self):
+        self.lb.build_splines(1)
+        g = np.array([5.0, 12.0, 26.0, 33.3, 47.0, 58.0])
+        step = 1e-6
+        expected = (self.lb.evaluate_many(g + step) -
+                    self.lb.evaluate_many(g - step)) / (2 * step)
+        np.testing.assert_allclose(self.lb.derivative_many(g), expected,
+                                   rtol=1e-5)
+
+    def test_acceptability_many(self):
+        g = np.concatenate([np.linspace(0, 60, 101), self.bounds])
+        expected = [self.lb.acceptability(gi) for gi in g]
+        np.testing.assert_allclose(self.lb.acceptability_many(g), expected)
+        self.assertEqual(self.lb.acceptability(5), 0.0)
+
+
+def linear_scan_beta(func, nsc, initial_beta=1.5):
+    """Smallest working beta found by the paper's linear scan."""
+    for beta in np.arange(initial_beta, 40, 0.5):
+        if func._try_beta(nsc, beta, 0.05):  # pylint: disable=protected-access
+            return beta
+    return None
+
+
+class TestBuildAllSplines(unittest.TestCase):
+
+    def test_matches_linear_scan(self):
+        rng = np.random.RandomState(0)
+        for nfuncs in (1, 6, 40):
+            funcs = []
+            for i in range(nfuncs):
+                edges = np.cumsum(rng.lognormal(0, 1.5, 5))
+                if i % 2:
+                    funcs.append(classfunctions.SmallerBetter(
+                        classfunctions.SoftBounds(*edges)))
+                else:
+                    funcs.append(classfunctions.LargerBetter(
+                        classfunctions.SoftBounds(*-edges)))
+            expected = max(linear_scan_beta(func, nfuncs) for func in funcs)
+            beta = classfunctions.build_all_splines(funcs)
+            self.assertEqual(beta, expected)
+            for func in funcs:
+                self.assertEqual(func.beta, beta)
+                gis = func.gis
+                self.assertTrue(func._try_beta(nfuncs, beta, 0.05))  # pylint: disable=protected-access
+                self.assertEqual(func.gis, gis)
+
+    def test_no_convergence(self):
+        func = classfunctions.SmallerBetter(
+            classfunctions.SoftBounds(10, 20, 30, 40, 50))
+        with self.assertRaises(RuntimeError):
+            func.build_splines(1, initial_beta=40.0)
+
+
+class TestPreferenceSet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = collections.OrderedDict()
+        rng = np.random.RandomState(0)
+        for i in range(12):
+            edges = np.cumsum(rng.uniform(1.0, 10.0, 5))
+            if i % 2:
+                func = classfunctions.SmallerBetter(
+                    classfunctions.SoftBounds(*edges))
+            else:
+                func = classfunctions.LargerBetter(
+                    classfunctions.SoftBounds(*-edges))
+            cls.prefs['soft{}'.format(i)] = func
+            if i % 4 == 1:
+                cls.prefs['hard{}'.format(i)] = classfunctions.MustBeBelow(
+                    classfunctions.HardBounds(1.0))
+        cls.prefs['range'] = classfunctions.MustBeInRange(
+            classfunctions.HardBounds(-1.0), classfunctions.HardBounds(1.0))
+        classfunctions.build_all_splines(list(cls.prefs.values()))
+        cls.compiled = classfunctions.PreferenceSet(cls.prefs)
+        # values spread over all regions, on bounds and a NaN
+        cls.values = np.empty((200, len(cls.prefs)))
+        for j, func in enumerate(cls.prefs.values()):
+            if isinstance(func, classfunctions.SmoothClassFunction):
+                low, high = sorted((func.bounds[0], func.bounds[-1]))
+                spread = 0.1 * (high - low)
+                cls.values[:, j] = rng.uniform(low - spread, high + spread,
+                                               200)
+                cls.values[:5, j] = func.bounds
+            else:
+                cls.values[:, j] = rng.uniform(-2, 2, 200)
+        cls.values[7, 0] = np.nan
+
+    def test_matches_class_functions(self):
+        self.assertEqual(self.compiled.bounds.shape, (12, 5))
+        aggregate, contributions = self.compiled.evaluate(self.values)
+        regions = self.compiled.regions(self.values)
+        expected = np.zeros(len(self.values))
+        for j, name in enumerate(self.compiled.soft_names):
+            func = self.prefs[name]
+            g = self.values[:, self.prefs_index(name)]
+            np.testing.assert_array_equal(regions[:, j],
+                                          func.which_region_many(g))
+            np.testing.assert_array_equal(contributions[:, j],
+                                          func.evaluate_many(g))
+            expected += func.evaluate_many(g)
+        np.testing.assert_array_equal(aggregate, expected)
+
+    def test_vector(self):
+        row = self.values[10]
+        aggregate, contributions = self.compiled.evaluate(row)
+        expected = 0.0
+        for name in self.compiled.soft_names:
+            expected += self.prefs[name].evaluate(row[self.prefs_index(name)])
+        self.assertEqual(aggregate, expected)
+        self.assertEqual(contributions.shape, (12,))
+
+    def test_feasible(self):
+        expected = [all(func.acceptability(value) == 1.0
+                        for value, func in zip(row, self.prefs.values())
+                        if isinstance(func, classfunctions.HardClassFunction))
+                    for row in self.values]
+        np.testing.assert_array_equal(self.compiled.feasible(self.values),
+                                      expected)
+
+    def test_unbuilt(self):
+        prefs = {'cost': classfunctions.SmallerBetter(
+            classfunctions.SoftBounds(10, 20, 30, 40, 50))}
+        with self.assertRaises(ValueError):
+            classfunctions.PreferenceSet(prefs)
+
+    def prefs_index(self, name):
+        return list(self.prefs).index(name)
+
+
+class TestUpdateBounds(unittest.TestCase):
+
+    def build(self, edges):
+        funcs = collections.OrderedDict()
+        for i, bounds in enumerate(edges):
+            funcs['soft{}'.format(i)] = classfunctions.SmallerBetter(
+                classfunctions.SoftBounds(*bounds))
+        funcs['hard'] = classfunctions.MustBeAbove(
+            classfunctions.HardBounds(0.0))
+        classfunctions.build_all_splines(list(funcs.values()))
+        return funcs
+
+    def check_update(self, edges, index, bounds):
+        funcs = self.build(edges)
+        beta = classfunctions.update_bounds(
+            funcs, 'soft{}'.format(index), classfunctions.SoftBounds(*bounds))
+        edges = list(edges)
+        edges[index] = bounds
+        expected = self.build(edges)
+        self.assertEqual(beta, expected['soft0'].beta)
+        for name, func in expected.items():
+            if name == 'hard':
+                continue
+            self.assertEqual(funcs[name].beta, func.beta)
+            np.testing.assert_array_equal(funcs[name].table.coeffs,
+                                          func.table.coeffs)
+        return funcs
+
+    def test_beta_unchanged(self):
+        edges = [(10, 20, 30, 40, 50), (1, 2, 30, 31, 32), (5, 6, 7, 8, 9)]
+        self.check_update(edges, 2, (5, 6, 7, 8, 10))
+
+    def test_beta_increases(self):
+        edges = [(10, 20, 30, 40, 50), (5, 6, 7, 8, 9)]
+        self.check_update(edges, 1, (1, 2, 30, 31, 32))
+
+    def test_beta_decreases(self):
+        edges = [(10, 20, 30, 40, 50), (1, 2, 30, 31, 32)]
+        self.check_update(edges, 1, (5, 6, 7, 8, 9))
+
+    def test_hard(self):
+        funcs = self.build([(10, 20, 30, 40, 50)])
+        table = funcs['soft0'].table
+        classfunctions.update_bounds(funcs, 'hard',
+                                     classfunctions.HardBounds(1.0))
+        self.assertEqual(funcs['hard'].acceptability(0.5), 0.0)
+        self.assertIs(funcs['soft0'].table, table)
+
+    def test_failed_update_restores(self):
+        funcs = self.build([(10, 20, 30, 40, 50), (5, 6, 7, 8, 9)])
+        before = {name: func.evaluate(25.0) for name, func in funcs.items()
+                  if name != 'hard'}
+        bounds = funcs['soft0'].bounds
+        with self.assertRaises(RuntimeError):
+            classfunctions.update_bounds(
+                funcs, 'soft0',
+                classfunctions.SoftBounds(10, 11, 1e5, 1e5 + 1, 1e5 + 2))
+        self.assertEqual(funcs['soft0'].bounds, bounds)
+        for name, value in before.items():
+            self.assertEqual(funcs[name].evaluate(25.0), value)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
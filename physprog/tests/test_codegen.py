@@ -0,0 +1,100 @@
+"""Unit tests for generated aggregate objectives."""
+# pylint: disable=invalid-name,missing-docstring
+import collections
+import unittest
+
+import numpy as np
+
+from physprog import benchmark
+from physprog import classfunctions
+from physprog import codegen
+from physprog import objective
+from physprog.tests.test_objective import ArrayBeam, sample_designs
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestCompileAggregate(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.prefs = collections.OrderedDict()
+        for i in range(12):
+            edges = np.cumsum(rng.lognormal(0, 1.0, 5)).tolist()
+            if i % 2:
+                self.prefs['dependent{}'.format(i)] = (
+                    classfunctions.SmallerBetter(
+                        classfunctions.SoftBounds(*edges)))
+            else:
+                self.prefs['dependent{}'.format(i)] = (
+                    classfunctions.LargerBetter(
+                        classfunctions.SoftBounds(*edges[::-1])))
+        classfunctions.build_all_splines(list(self.prefs.values()))
+        self.aggregate = codegen.compile_aggregate(self.prefs)
+
+    def random_values(self, n):
+        """Values scattered over all six regions of every dependent."""
+        rng = np.random.RandomState(0)
+        bounds = np.array([func.bounds for func in self.prefs.values()])
+        low = np.minimum(bounds[:, 0], bounds[:, 4])
+        high = np.maximum(bounds[:, 0], bounds[:, 4])
+        spread = high - low
+        values = low - 0.2 * spread + rng.uniform(size=(n, len(bounds))) * (
+            1.4 * spread)
+        # and some exactly on the bounds
+        values[:5] = bounds.T
+        return values
+
+    def expected(self, row):
+        total = 0.0
+        for func, g in zip(self.prefs.values(), row):
+            total += func.evaluate(g)
+        return total
+
+    def test_scalar(self):
+        values = self.random_values(200)
+        for row in values:
+            expected = self.expected(row)
+            self.assertAlmostEqual(self.aggregate(row.tolist()), expected,
+                                   delta=1e-13 * abs(expected))
+            self.assertAlmostEqual(self.aggregate(row), expected,
+                                   delta=1e-13 * abs(expected))
+
+    def test_batch(self):
+        values = self.random_values(200)
+        compiled = classfunctions.PreferenceSet(self.prefs)
+        np.testing.assert_array_equal(self.aggregate(values),
+                                      compiled.evaluate(values)[0])
+        np.testing.assert_allclose(
+            self.aggregate(values), [self.expected(row) for row in values],
+            rtol=1e-13)
+
+    def test_names_and_source(self):
+        self.assertEqual(self.aggregate.names, list(self.prefs))
+        self.assertIn("# 'dependent0' (LargerBetter)", self.aggregate.source)
+
+    def test_not_built(self):
+        with self.assertRaises(ValueError):
+            codegen.compile_aggregate(benchmark.random_preferences(2))
+
+
+class TestBuildObjective(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def test_matches_generic(self):
+        for model in (SampleProblemBeam(), ArrayBeam()):
+            generic = objective.build_objective(model, self.prefs)
+            compiled = codegen.build_objective(model, self.prefs)
+            for x in sample_designs(20):
+                self.assertAlmostEqual(compiled(x), generic(x), places=12)
+
+    def test_invalid_design(self):
+        compiled = codegen.build_objective(ArrayBeam(), self.prefs)
+        self.assertEqual(compiled([0.3, 0.35, 0.4, 0.4, float('nan')]),
+                         objective.INVALID_PENALTY)
+
+
+if __name__ == '__main__':
+    unittest.main()
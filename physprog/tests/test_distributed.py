@@ -0,0 +1,139 @@
+"""Unit tests for model evaluation on distributed workers."""
+# pylint: disable=invalid-name,missing-docstring
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import distributed
+from physprog import objective
+from physprog import optimize
+from physprog.tests.test_objective import sample_designs
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class PickyBeam(SampleProblemBeam):
+    """Sample beam that rejects designs with a negative length."""
+
+    def evaluate(self, x=None):
+        if x is not None:
+            self.design = x
+        if self.design.L < 0:
+            raise ValueError('Negative length')
+        return super(PickyBeam, self).evaluate()
+
+
+class CrashingBeam(SampleProblemBeam):
+    """Sample beam whose process dies the first time it is evaluated."""
+
+    def __init__(self, marker):
+        super(CrashingBeam, self).__init__()
+        self.marker = marker
+
+    def evaluate(self, x=None):
+        if not os.path.exists(self.marker):
+            open(self.marker, 'w').close()
+            os._exit(1)  # pylint: disable=protected-access
+        return super(CrashingBeam, self).evaluate(x)
+
+
+class BrokenBeam(SampleProblemBeam):
+    """Sample beam with a bug that fails every evaluation."""
+
+    def evaluate(self, x=None):
+        raise RuntimeError('Simulator license expired')
+
+
+class TestDistributedModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+        cls.names = list(cls.prefs)
+
+    def start(self, worker_model, count=2, **options):
+        model = distributed.DistributedModel(
+            self.names, SampleProblemBeam().design, **options)
+        self.addCleanup(model.close)
+        model.spawn_workers(worker_model, count)
+        return model
+
+    def test_objective_matches_local_model(self):
+        model = self.start(SampleProblemBeam())
+        remote = objective.build_objective(model, self.prefs)
+        local = objective.build_objective(SampleProblemBeam(), self.prefs)
+        for x in sample_designs(5):
+            self.assertAlmostEqual(remote(x), local(x), places=12)
+
+    def test_batches_match_local_model(self):
+        model = self.start(SampleProblemBeam(), batchsize=3)
+        designs = sample_designs(20)
+        remote = objective.build_batch_objective(model, self.prefs)
+        local = objective.build_batch_objective(SampleProblemBeam(),
+                                                self.prefs)
+        np.testing.assert_allclose(remote(designs), local(designs),
+                                   rtol=1e-12)
+
+    def test_rejected_designs(self):
+        model = self.start(PickyBeam())
+        designs = sample_designs(4)
+        designs[1, 4] = -1.0
+        values = model.evaluate_many(designs)
+        self.assertTrue(np.all(np.isnan(
+            [values[name][1] for name in self.names])))
+        self.assertTrue(np.all(np.isfinite(values['cost'][[0, 2, 3]])))
+        with self.assertRaises(ValueError):
+            objective.dependent_reader(model, self.names)(designs[1])
+
+    def test_constraints(self):
+        model = self.start(SampleProblemBeam())
+        local = SampleProblemBeam()
+        for remote_constraint, local_constraint in zip(
+                optimize.get_constraints(model, self.prefs),
+                optimize.get_constraints(local, self.prefs)):
+            x = sample_designs(1)[0]
+            self.assertAlmostEqual(
+                remote_constraint['fun'](x, *remote_constraint['args']),
+                local_constraint['fun'](x, *local_constraint['args']))
+
+    def test_optimize(self):
+        model = self.start(SampleProblemBeam())
+        local = SampleProblemBeam()
+        optimize.optimize(model, self.prefs)
+        optimize.optimize(local, self.prefs)
+        np.testing.assert_allclose(model.design, local.design, rtol=1e-6)
+
+    def test_retry_after_worker_dies(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        marker = os.path.join(tmpdir, 'crashed')
+        model = self.start(CrashingBeam(marker), timeout=1.0)
+        values = model.evaluate_many(sample_designs(4))
+        expected = objective.dependent_matrix(
+            SampleProblemBeam(), sample_designs(4), self.names)
+        np.testing.assert_allclose(
+            np.column_stack([values[name] for name in self.names]), expected)
+
+    def test_authkey_required_beyond_loopback(self):
+        with self.assertRaises(ValueError):
+            distributed.DistributedModel(self.names, address=('', 0))
+        model = distributed.DistributedModel(self.names, address=('', 0),
+                                             authkey=b'secret')
+        model.close()
+
+    def test_random_authkey(self):
+        model = self.start(SampleProblemBeam(), count=1)
+        self.assertEqual(len(model.authkey), 32)
+        self.assertEqual(len(model.evaluate()), len(self.names))
+
+    def test_give_up_after_retries(self):
+        model = self.start(BrokenBeam(), timeout=0.5, retries=1)
+        with self.assertRaises(ValueError):
+            objective.dependent_reader(model, self.names)(sample_designs(1)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Unit tests for the population-based optimizer."""
+# pylint: disable=invalid-name,missing-docstring
+import collections
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import optimize
+from physprog.tests.test_objective import VectorizedBeam
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+BEAM_BOUNDS = [(0.2, 0.4), (0.3, 0.5), (0.35, 0.6), (0.3, 0.6), (3.0, 6.0)]
+
+
+class DoubleWell(object):
+    """One design variable with a shallow well at 2 and a deep one at -2."""
+
+    def __init__(self):
+        self.design = [2.0]
+
+    def evaluate(self, x=None):
+        if x is not None:
+            self.design = x
+        return [self.energy(), self.position()]
+
+    def energy(self):
+        x = self.design[0]
+        return (x * x - 4.0) ** 2 + x + 10.0
+
+    def position(self):
+        return self.design[0]
+
+    def evaluate_many(self, designs):
+        x = np.asarray(designs, dtype=float)[:, 0]
+        return {'energy': (x * x - 4.0) ** 2 + x + 10.0, 'position': x}
+
+
+def double_well_preferences(cutoff=None):
+    prefs = collections.OrderedDict()
+    prefs['energy'] = classfunctions.SmallerBetter(
+        classfunctions.SoftBounds(8.0, 12.0, 16.0, 20.0, 40.0))
+    if cutoff is None:
+        cutoff = 10.0
+    prefs['position'] = classfunctions.MustBeBelow(
+        classfunctions.HardBounds(cutoff))
+    classfunctions.build_all_splines(list(prefs.values()))
+    return prefs
+
+
+class TestDifferentialEvolution(unittest.TestCase):
+
+    def test_escapes_local_well(self):
+        prefs = double_well_preferences()
+        local = optimize.optimize(DoubleWell(), prefs)
+        self.assertGreater(local.x[0], 0.0)
+
+        model = DoubleWell()
+        result = optimize.optimize(
+            model, prefs, method='differential_evolution',
+            options={'bounds': [(-4.0, 4.0)], 'seed': 0})
+        self.assertAlmostEqual(result.x[0], -2.0, delta=0.05)
+        self.assertLess(result.fun, local.fun)
+        self.assertTrue(result.success)
+        self.assertEqual(model.design[0], result.x[0])
+
+    def test_feasibility_mask(self):
+        # the deep well is excluded by a hard constraint
+        prefs = double_well_preferences(cutoff=-2.5)
+        result = optimize.optimize(
+            DoubleWell(), prefs, method='differential_evolution',
+            options={'bounds': [(-4.0, 4.0)], 'seed': 0, 'polish': False})
+        self.assertTrue(result.success)
+        self.assertLessEqual(result.x[0], -2.5)
+        self.assertTrue(np.all(result.population[:, 0] <= -2.5))
+
+    def test_beam(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        local = optimize.optimize(SampleProblemBeam(), prefs)
+        result = optimize.optimize(
+            VectorizedBeam(), prefs, method='differential_evolution',
+            options={'bounds': BEAM_BOUNDS, 'seed': 0})
+        self.assertTrue(result.success)
+        self.assertLessEqual(result.fun, local.fun + 1e-6)
+
+    def test_polish_within_bounds(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        design = np.array(SampleProblemBeam().design)
+        bounds = np.column_stack([design - 0.01, design + 0.01])
+        result = optimize.optimize(
+            VectorizedBeam(), prefs, method='differential_evolution',
+            options={'bounds': bounds, 'seed': 0, 'generations': 20})
+        self.assertTrue(np.all(result.x >= bounds[:, 0]))
+        self.assertTrue(np.all(result.x <= bounds[:, 1]))
+
+    def test_process_pool(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        options = {'bounds': BEAM_BOUNDS, 'seed': 0, 'generations': 10,
+                   'polish': False}
+        serial = optimize.optimize(SampleProblemBeam(), prefs,
+                                   method='differential_evolution',
+                                   options=options)
+        options['max_workers'] = 2
+        pooled = optimize.optimize(SampleProblemBeam(), prefs,
+                                   method='differential_evolution',
+                                   options=options)
+        np.testing.assert_array_equal(pooled.population, serial.population)
+        self.assertEqual(pooled.fun, serial.fun)
+
+    def test_custom_method(self):
+        calls = []
+
+        def method(model, preferences, **options):
+            calls.append(options)
+            return optimize.OPTIMIZERS['differential_evolution'](
+                model, preferences, **options)
+
+        optimize.optimize(DoubleWell(), double_well_preferences(),
+                          method=method,
+                          options={'bounds': [(-4.0, 4.0)], 'seed': 1,
+                                   'generations': 5})
+        self.assertEqual(calls[0]['generations'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
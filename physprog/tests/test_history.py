@@ -0,0 +1,112 @@
+"""Unit tests for recording model evaluations."""
+# pylint: disable=invalid-name,missing-docstring
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import history
+from physprog import objective
+from physprog import optimize
+from physprog.tests.test_caching import CountingBeam
+from physprog.tests.test_objective import sample_designs
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestHistory(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'run.history')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_records(self):
+        beam = CountingBeam()
+        recorder = history.History(beam, self.prefs, flush_every=10)
+        aggregate = objective.build_objective(recorder, self.prefs)
+        expected = objective.build_objective(SampleProblemBeam(), self.prefs)
+        designs = sample_designs(70)
+        for x in designs:
+            self.assertAlmostEqual(aggregate(x), expected(x))
+        aggregate(designs[0])
+        self.assertEqual(beam.calls, 70)
+        records = recorder.records()
+        self.assertEqual(len(recorder), 70)
+        np.testing.assert_array_equal(records.designs, designs)
+        self.assertEqual(records.dependents[0, 1],
+                         SampleProblemBeam().evaluate(designs[0])[1])
+        # three MustBeAbove constraints on layer widths
+        np.testing.assert_allclose(records.constraints,
+                                   records.dependents[:, 6:] - 0.01)
+
+    def test_invalid_design(self):
+        recorder = history.History(SampleProblemBeam(), self.prefs)
+        recorder.evaluate([0.0, 0.35, 0.3, 0.4, 5.0])
+        self.assertEqual(recorder.records().values[0],
+                         objective.INVALID_PENALTY)
+        with self.assertRaises(ValueError):
+            recorder.cost()
+
+    def test_checkpoint_and_resume(self):
+        designs = sample_designs(25)
+        with history.History(SampleProblemBeam(), self.prefs, self.path,
+                             flush_every=10) as recorder:
+            for x in designs[:15]:
+                recorder.evaluate(x)
+            # only whole batches are on disk before closing
+            self.assertEqual(len(history.load_history(self.path).values), 10)
+        # a record cut off mid-write is ignored
+        with open(self.path, 'ab') as out:
+            out.write(b'\0' * 12)
+
+        beam = CountingBeam()
+        resumed = history.History(beam, self.prefs, self.path)
+        self.assertEqual(len(resumed), 15)
+        for x in designs:
+            resumed.evaluate(x)
+        self.assertEqual(beam.calls, 10)
+        best = resumed.best()
+        self.assertEqual(resumed.records().values[best],
+                         resumed.records().values.min())
+        # records written after the cut-off one line up again
+        resumed.close()
+        records = history.load_history(self.path)
+        np.testing.assert_array_equal(records.designs, designs)
+        np.testing.assert_array_equal(records.values,
+                                      resumed.records().values)
+
+    def test_wrong_preferences(self):
+        with history.History(SampleProblemBeam(), self.prefs,
+                             self.path) as recorder:
+            recorder.evaluate(SampleProblemBeam().design)
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        del prefs['mass']
+        with self.assertRaises(ValueError):
+            history.History(SampleProblemBeam(), prefs, self.path)
+
+    def test_optimize_resumes(self):
+        beam = CountingBeam()
+        first = optimize.optimize(beam, self.prefs, history=self.path)
+        calls = beam.calls
+        records = history.load_history(self.path)
+        self.assertEqual(len(records.values), calls)
+
+        beam = CountingBeam()
+        second = optimize.optimize(beam, self.prefs, history=self.path)
+        self.assertAlmostEqual(second.fun, first.fun, places=6)
+        # warm start at the optimum needs far fewer new evaluations
+        self.assertLess(beam.calls, calls / 2)
+        np.testing.assert_array_equal(beam.design, second.x)
+
+
+if __name__ == '__main__':
+    unittest.main()
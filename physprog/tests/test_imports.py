@@ -0,0 +1,43 @@
+"""Check that evaluation-only imports stay light."""
+# pylint: disable=invalid-name,missing-docstring
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# generous for slow CI machines. Loading matplotlib alone used to take longer.
+IMPORT_BUDGET = 0.5  # seconds
+
+MEASURE = '''
+import json, sys, time
+start = time.perf_counter()
+import physprog.objective
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+'''
+
+
+def measure_import():
+    """Import physprog.objective in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=ROOT, MPLBACKEND='Agg')
+    output = subprocess.check_output([sys.executable, '-c', MEASURE],
+                                     cwd=ROOT, env=env)
+    return json.loads(output.decode())
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_objective_import(self):
+        result = min((measure_import() for _i in range(3)),
+                     key=lambda result: result['elapsed'])
+        for heavy in ('matplotlib', 'yaml', 'scipy'):
+            self.assertNotIn(heavy, result['modules'])
+        self.assertLess(result['elapsed'], IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
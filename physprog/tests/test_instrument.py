@@ -0,0 +1,90 @@
+"""Unit tests for instrumentation of optimization runs."""
+# pylint: disable=invalid-name,missing-docstring
+import logging
+import unittest
+
+from physprog import classfunctions
+from physprog import instrument
+from physprog import objective
+from physprog import optimize
+from physprog.tests.test_caching import CountingBeam
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.events = []
+        self.instrument = instrument.Instrumentation(
+            callback=lambda event, fields: self.events.append((event, fields)),
+            logger=None)
+
+    def test_objective(self):
+        beam = SampleProblemBeam()
+        x = beam.design
+        plain = objective.build_objective(beam, self.prefs)
+        counted = objective.build_objective(
+            self.instrument.wrap_model(beam), self.prefs, self.instrument)
+        self.assertEqual(counted(x), plain(x))
+        counted(x)
+        self.assertEqual(self.instrument.counts['objective'], 2)
+        self.assertEqual(self.instrument.counts['model'], 2)
+        # initial beam has desirable mass but only tolerable width
+        self.assertEqual(self.instrument.regions['width'], [0, 0, 2, 0, 0, 0])
+        self.assertEqual(self.instrument.regions['mass'], [0, 2, 0, 0, 0, 0])
+        self.assertNotIn('width_layer1', self.instrument.regions)
+
+    def test_optimize(self):
+        beam = SampleProblemBeam()
+        optimize.optimize(beam, self.prefs, instrument=self.instrument)
+        (event, fields), = self.events
+        self.assertEqual(event, 'optimize')
+        counts = fields['counts']
+        self.assertGreater(counts['model'], 0)
+        self.assertGreater(counts['constraint'], 0)
+        for hist in fields['regions'].values():
+            self.assertEqual(sum(hist), counts['objective'])
+        for phase in ('model', 'classfunctions', 'constraint', 'minimize'):
+            self.assertGreater(fields['times'][phase], 0.0)
+        self.assertLess(fields['times']['model'], fields['times']['minimize'])
+
+    def test_model_runs(self):
+        for cache in (False, True):
+            beam = CountingBeam()
+            counters = instrument.Instrumentation(logger=None)
+            optimize.optimize(beam, self.prefs, cache=cache,
+                              instrument=counters)
+            # constraints run the model too, unless the cache answers
+            self.assertEqual(counters.counts['model'], beam.calls)
+            if cache:
+                self.assertLessEqual(beam.calls, counters.counts['objective'])
+            else:
+                self.assertGreater(beam.calls, counters.counts['objective'])
+
+    def test_reused(self):
+        for _run in range(2):
+            optimize.optimize(SampleProblemBeam(), self.prefs,
+                              instrument=self.instrument)
+        # each run adds only its own time outside our callbacks
+        times = self.instrument.times
+        self.assertAlmostEqual(
+            sum(times[phase] for phase in ('model', 'classfunctions',
+                                           'constraint', 'constraint_jacobian',
+                                           'gradient', 'optimizer')),
+            times['minimize'])
+
+    def test_logging(self):
+        logged = instrument.Instrumentation()
+        logged.counts['model'] = 3
+        with self.assertLogs('physprog.instrument', logging.INFO) as logs:
+            logged.emit('done', **logged.summary())
+        self.assertIn("counts={'model': 3}", logs.output[0])
+        self.assertEqual(logs.records[0].event, 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+"""Unit tests for building aggregate objective functions."""
+# pylint: disable=invalid-name,missing-docstring
+import math
+import unittest
+
+import numpy as np
+import scipy.optimize
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import optimize
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class VectorizedBeam(SampleProblemBeam):
+    """Sample beam that evaluates many designs at once."""
+
+    def evaluate_many(self, designs):
+        d1, d2, d3, b, L = np.asarray(designs, dtype=float).T
+        ei = 2.0 / 3.0 * b * (self.E1 * d1 ** 3 +
+                              self.E2 * (d2 ** 3 - d1 ** 3) +
+                              self.E3 * (d3 ** 3 - d2 ** 3))
+        mu = 2 * b * (self.RHO1 * d1 +
+                      self.RHO2 * (d2 - d1) +
+                      self.RHO3 * (d3 - d2))
+        with np.errstate(invalid='ignore'):
+            frequency = np.pi / (2 * L ** 2) * np.sqrt(ei / mu)
+        return {
+            'frequency': frequency,
+            'cost': 2 * b * L * (self.C1 * d1 +
+                                 self.C2 * (d2 - d1) +
+                                 self.C3 * (d3 - d2)),
+            'width': b,
+            'length': L,
+            'mass': mu * L,
+            'semiheight': d3,
+            'width_layer1': d1,
+            'width_layer2': d2 - d1,
+            'width_layer3': d3 - d2,
+        }
+
+
+class JacobianBeam(SampleProblemBeam):
+    """Sample beam that also provides the gradients of its dependents."""
+
+    NAMES = ('frequency', 'cost', 'width', 'length', 'mass', 'semiheight',
+             'width_layer1', 'width_layer2', 'width_layer3')
+
+    def jacobian(self, x):
+        # central differences stand in for a model's analytic Jacobian
+        x = np.asarray(x, dtype=float)
+        step = 1e-7
+        jacobian = {name: np.empty(len(x)) for name in self.NAMES}
+        for j in range(len(x)):
+            dx = np.zeros(len(x))
+            dx[j] = step
+            self.design = x + dx
+            upper = [getattr(self, name)() for name in self.NAMES]
+            self.design = x - dx
+            lower = [getattr(self, name)() for name in self.NAMES]
+            for name, up, low in zip(self.NAMES, upper, lower):
+                jacobian[name][j] = (up - low) / (2 * step)
+        self.design = x
+        return jacobian
+
+
+class CallCounter(object):
+    """Model wrapper counting the calls to its methods."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.model, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args):
+            self.calls += 1
+            return attr(*args)
+        return counted
+
+
+class ArrayBeam(object):
+    """Sample beam returning all dependents from evaluate as one array."""
+
+    dependents = JacobianBeam.NAMES
+
+    def __init__(self):
+        self.design = SampleProblemBeam().design
+
+    def evaluate(self, x=None):
+        if x is not None:
+            self.design = x
+        d1, d2, d3, b, L = self.design
+        beam = SampleProblemBeam
+        ei = 2.0 / 3.0 * b * (beam.E1 * d1 ** 3 +
+                              beam.E2 * (d2 ** 3 - d1 ** 3) +
+                              beam.E3 * (d3 ** 3 - d2 ** 3))
+        mu = 2 * b * (beam.RHO1 * d1 +
+                      beam.RHO2 * (d2 - d1) +
+                      beam.RHO3 * (d3 - d2))
+        frequency = (math.pi / (2 * L ** 2) * math.sqrt(ei / mu)
+                     if ei / mu >= 0 else np.nan)
+        cost = 2 * b * L * (beam.C1 * d1 +
+                            beam.C2 * (d2 - d1) +
+                            beam.C3 * (d3 - d2))
+        return np.array([frequency, cost, b, L, mu * L, d3,
+                         d1, d2 - d1, d3 - d2])
+
+
+def sample_designs(n, seed=0):
+    """Random beam designs scattered around the initial design."""
+    rng = np.random.RandomState(seed)
+    return (np.array(SampleProblemBeam().design) *
+            rng.uniform(0.95, 1.05, (n, 5)))
+
+
+class TestBatchObjective(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.designs = sample_designs(50)
+        scalar = objective.build_objective(SampleProblemBeam(), self.prefs)
+        self.expected = [scalar(x) for x in self.designs]
+
+    def test_fallback_matches_scalar(self):
+        batch = objective.build_batch_objective(SampleProblemBeam(),
+                                                self.prefs)
+        np.testing.assert_array_equal(batch(self.designs), self.expected)
+
+    def test_vectorized_model(self):
+        batch = objective.build_batch_objective(VectorizedBeam(), self.prefs)
+        np.testing.assert_allclose(batch(self.designs), self.expected,
+                                   rtol=1e-12)
+
+    def test_invalid_designs_penalized(self):
+        # inner layers thicker than the outer one give an imaginary frequency
+        self.designs[3, :3] = [0.0, 0.35, 0.3]
+        for model in (SampleProblemBeam(), VectorizedBeam()):
+            batch = objective.build_batch_objective(model, self.prefs)
+            values = batch(self.designs)
+            self.assertEqual(values[3], objective.INVALID_PENALTY)
+            np.testing.assert_allclose(values[4:], self.expected[4:],
+                                       rtol=1e-12)
+
+
+class TestGradient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def test_matches_finite_differences(self):
+        beam = JacobianBeam()
+        aggregate = objective.build_objective(beam, self.prefs)
+        gradient = objective.build_gradient(beam, self.prefs)
+        for x in sample_designs(10):
+            expected = scipy.optimize.approx_fprime(x, aggregate, 1e-8)
+            np.testing.assert_allclose(gradient(x), expected,
+                                       rtol=1e-4, atol=1e-6)
+
+    def test_optimize_with_jacobian(self):
+        beam = JacobianBeam()
+        optimize.optimize(beam, self.prefs, plot=False)
+        self.assertLess(beam.cost(), 1060.0)
+
+
+class TestArrayProtocol(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.designs = sample_designs(20)
+        scalar = objective.build_objective(SampleProblemBeam(), self.prefs)
+        self.expected = [scalar(x) for x in self.designs]
+
+    def test_objective_matches_methods(self):
+        aggregate = objective.build_objective(ArrayBeam(), self.prefs)
+        np.testing.assert_allclose([aggregate(x) for x in self.designs],
+                                   self.expected, rtol=1e-12)
+        batch = objective.build_batch_objective(ArrayBeam(), self.prefs)
+        np.testing.assert_allclose(batch(self.designs), self.expected,
+                                   rtol=1e-12)
+
+    def test_index_mapping(self):
+        beam = ArrayBeam()
+        beam.dependents = {name: i for i, name in enumerate(beam.dependents)}
+        aggregate = objective.build_objective(beam, self.prefs)
+        self.assertAlmostEqual(aggregate(self.designs[0]), self.expected[0])
+
+    def test_invalid_design(self):
+        aggregate = objective.build_objective(ArrayBeam(), self.prefs)
+        self.assertEqual(aggregate([0.0, 0.35, 0.3, 0.4, 5.0]),
+                         objective.INVALID_PENALTY)
+
+    def test_constraints(self):
+        for vectorized in (False, True):
+            expected = optimize.get_constraints(
+                SampleProblemBeam(), self.prefs, vectorized)
+            constraints = optimize.get_constraints(
+                ArrayBeam(), self.prefs, vectorized)
+            for x in self.designs:
+                np.testing.assert_allclose(
+                    [c['fun'](x, *c.get('args', ())) for c in constraints],
+                    [c['fun'](x, *c.get('args', ())) for c in expected])
+
+    def test_optimize(self):
+        for cache in (False, True):
+            expected = optimize.optimize(SampleProblemBeam(), self.prefs)
+            beam = ArrayBeam()
+            result = optimize.optimize(beam, self.prefs, cache=cache)
+            self.assertAlmostEqual(result.fun, expected.fun, places=6)
+            np.testing.assert_array_equal(beam.design, result.x)
+
+    def test_calls_per_design(self):
+        # one array evaluation replaces evaluate plus a call per dependent
+        nsoft = sum(isinstance(func, classfunctions.SmoothClassFunction)
+                    for func in self.prefs.values())
+        for beam, calls in ((SampleProblemBeam(), 1 + nsoft),
+                            (ArrayBeam(), 1)):
+            counted = CallCounter(beam)
+            aggregate = objective.build_objective(counted, self.prefs)
+            for x in self.designs:
+                aggregate(x)
+            self.assertEqual(counted.calls, calls * len(self.designs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Unit tests for optimization helpers."""
+# pylint: disable=invalid-name,missing-docstring
+import collections
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import finitediff
+from physprog import instrument
+from physprog import objective
+from physprog import optimize
+from physprog.tests.test_objective import JacobianBeam
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+def hard_preferences():
+    """Hard class functions of every kind on the sample beam."""
+    return collections.OrderedDict([
+        ('width_layer1', classfunctions.MustBeAbove(
+            classfunctions.HardBounds(0.01))),
+        ('mass', classfunctions.MustBeBelow(
+            classfunctions.HardBounds(2500.0))),
+        ('length', classfunctions.MustBeInRange(
+            classfunctions.HardBounds(4.0), classfunctions.HardBounds(6.0))),
+    ])
+
+
+class TestConstraints(unittest.TestCase):
+
+    def setUp(self):
+        self.x = np.array(SampleProblemBeam().design)
+
+    def test_separate_constraints(self):
+        beam = SampleProblemBeam()
+        constraints = optimize.get_constraints(beam, hard_preferences())
+        values = [c['fun'](self.x, *c['args']) for c in constraints]
+        np.testing.assert_allclose(values, [0.29, 270.0, 1.0, 1.0])
+
+    def test_vectorized_matches_separate(self):
+        beam = JacobianBeam()
+        prefs = hard_preferences()
+        separate = optimize.get_constraints(beam, prefs)
+        vectorized, = optimize.get_constraints(beam, prefs, vectorized=True)
+        np.testing.assert_array_equal(
+            vectorized['fun'](self.x),
+            [c['fun'](self.x, *c['args']) for c in separate])
+        np.testing.assert_array_equal(
+            vectorized['jac'](self.x),
+            [c['jac'](self.x, *c['args']) for c in separate])
+
+    def test_no_hard_constraints(self):
+        prefs = collections.OrderedDict()
+        self.assertEqual(
+            optimize.get_constraints(SampleProblemBeam(), prefs,
+                                     vectorized=True), [])
+
+    def test_optimize_vectorized(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        separate = SampleProblemBeam()
+        optimize.optimize(separate, prefs)
+        vectorized = SampleProblemBeam()
+        optimize.optimize(vectorized, prefs, vectorized_constraints=True)
+        self.assertAlmostEqual(vectorized.cost(), separate.cost(), places=3)
+
+
+class TestMultistart(unittest.TestCase):
+
+    def setUp(self):
+        x = np.array(SampleProblemBeam().design)
+        self.bounds = np.array([0.95 * x, 1.05 * x]).T
+
+    def test_latin_hypercube(self):
+        designs = optimize.sample_designs(self.bounds, 10, 'lhs', seed=1)
+        self.assertEqual(designs.shape, (10, 5))
+        for (low, high), column in zip(self.bounds, designs.T):
+            slices = np.floor((column - low) / (high - low) * 10)
+            np.testing.assert_array_equal(np.sort(slices), np.arange(10))
+
+    def test_multistart(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        beam = SampleProblemBeam()
+        results = optimize.multistart(beam, prefs, starts=3,
+                                      bounds=self.bounds, sampling='lhs',
+                                      max_workers=2, seed=0)
+        self.assertEqual(len(results), 3)
+        values = [result.value for result in results]
+        self.assertEqual(values, sorted(values))
+        np.testing.assert_array_equal(beam.design, results[0].design)
+        self.assertLess(beam.cost(), 1060.0)
+
+    def test_given_starts(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        starts = optimize.sample_designs(self.bounds, 2, seed=2)
+        results = optimize.multistart(SampleProblemBeam(), prefs,
+                                      starts=starts, max_workers=2)
+        self.assertEqual(sorted(result.start for result in results),
+                         sorted(tuple(x) for x in starts))
+
+
+class TestParallelGradient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def test_stencil(self):
+        # keep the width clear of a region bound, where slopes jump
+        x = np.array([0.3, 0.35, 0.4, 0.42, 5.0])
+        beam = JacobianBeam()
+        aggregate = objective.build_objective(beam, self.prefs)
+        expected_gradient = objective.build_gradient(beam, self.prefs)(x)
+        vectorized, = optimize.get_constraints(beam, self.prefs,
+                                               vectorized=True)
+        for scheme, npoints in (('forward', 6), ('central', 11)):
+            with finitediff.ParallelDifferences(
+                    SampleProblemBeam(), self.prefs, scheme,
+                    max_workers=2) as stencils:
+                self.assertEqual(len(stencils.stencil(x)[0]), npoints)
+                # line searches only need the value at the design itself
+                self.assertAlmostEqual(stencils.objective(x), aggregate(x))
+                self.assertEqual(stencils.batches, 1)
+                np.testing.assert_allclose(stencils.gradient(x),
+                                           expected_gradient, rtol=1e-4)
+                np.testing.assert_allclose(stencils.constraint_values(x),
+                                           vectorized['fun'](x))
+                np.testing.assert_allclose(stencils.constraint_jacobian(x),
+                                           vectorized['jac'](x), atol=1e-6)
+                self.assertEqual(stencils.batches, 2)
+
+    def test_optimize(self):
+        serial = optimize.optimize(SampleProblemBeam(), self.prefs)
+        for scheme in ('forward', 'central'):
+            beam = SampleProblemBeam()
+            counters = instrument.Instrumentation(logger=None)
+            result = optimize.optimize(beam, self.prefs,
+                                       parallel_gradient=scheme,
+                                       max_workers=2, instrument=counters)
+            self.assertAlmostEqual(result.fun, serial.fun, places=4)
+            self.assertLess(beam.cost(), 1060.0)
+            self.assertGreater(counters.counts['stencil'], 0)
+
+
+class TestWhatIfSession(unittest.TestCase):
+
+    def test_update(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        beam = SampleProblemBeam()
+        session = optimize.WhatIfSession(beam, prefs)
+        session.optimize()
+        first_design = tuple(beam.design)
+        bounds = classfunctions.SoftBounds(900.0, 1300.0, 1500.0, 1600.0,
+                                           1700.0)
+        misses = session.model.misses
+        result = session.update('cost', bounds)
+
+        # same optimum as building and optimizing from scratch
+        fresh = classfunctions.from_input(SAMPLE_INPUT)
+        fresh['cost'].bounds = bounds
+        classfunctions.build_all_splines(list(fresh.values()))
+        self.assertEqual(prefs['cost'].beta, fresh['cost'].beta)
+        cold = optimize.optimize(SampleProblemBeam(), fresh)
+        self.assertAlmostEqual(result.fun, cold.fun, places=4)
+        self.assertNotEqual(tuple(beam.design), first_design)
+        self.assertLess(beam.cost(), 1700.0)
+        # the warm start reused evaluations of the first run
+        self.assertGreater(session.model.hits, 0)
+        self.assertGreater(session.model.misses, misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Unit tests for robust design under uncertain design variables."""
+# pylint: disable=invalid-name,missing-docstring
+import unittest
+
+import numpy as np
+import scipy.optimize
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import robust
+from physprog.tests.test_objective import VectorizedBeam
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestRobustObjective(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.x = np.array(SampleProblemBeam().design)
+        self.tolerances = np.full(5, 0.002)
+
+    def test_no_uncertainty(self):
+        robust_objective = robust.RobustObjective(
+            VectorizedBeam(), self.prefs, np.zeros(5), samples=16)
+        nominal = objective.build_objective(SampleProblemBeam(), self.prefs)
+        statistics = robust_objective.evaluate(self.x)
+        self.assertAlmostEqual(statistics.mean, nominal(self.x))
+        self.assertAlmostEqual(statistics.quantile, nominal(self.x))
+
+    def test_common_random_numbers(self):
+        robust_objective = robust.RobustObjective(
+            VectorizedBeam(), self.prefs, self.tolerances, samples=500)
+        self.assertEqual(robust_objective(self.x), robust_objective(self.x))
+        # smooth enough for finite differences
+        step = 1e-7
+        dx = np.zeros(5)
+        dx[4] = step
+        slope = (robust_objective(self.x + dx) -
+                 robust_objective(self.x - dx)) / (2 * step)
+        slope2 = (robust_objective(self.x + 2 * dx) -
+                  robust_objective(self.x - 2 * dx)) / (4 * step)
+        self.assertAlmostEqual(slope, slope2, delta=1e-3 * abs(slope))
+
+    def test_chunks_and_scalar_models(self):
+        vectorized = robust.RobustObjective(
+            VectorizedBeam(), self.prefs, self.tolerances, samples=100,
+            chunksize=7)
+        scalar = robust.RobustObjective(
+            SampleProblemBeam(), self.prefs, self.tolerances, samples=100)
+        expected = scalar.evaluate(self.x)
+        statistics = vectorized.evaluate(self.x)
+        for name in robust.STATISTICS:
+            self.assertAlmostEqual(getattr(statistics, name),
+                                   getattr(expected, name))
+        self.assertGreaterEqual(statistics.quantile, statistics.mean)
+
+    def test_unacceptable_probability(self):
+        # the nominal frequency (113 Hz) is close to the unacceptable 100 Hz
+        robust_objective = robust.RobustObjective(
+            VectorizedBeam(), self.prefs, [0.0, 0.0, 0.0, 0.0, 0.1],
+            samples=2000, statistic='unacceptable', distribution='uniform',
+            relative=True)
+        probability = robust_objective(self.x)
+        # unacceptable once L > 5.31, i.e. for about 19% of the samples
+        self.assertAlmostEqual(probability, 0.19, delta=0.04)
+        shorter = self.x.copy()
+        shorter[4] = 4.5
+        self.assertEqual(robust_objective(shorter), 0.0)
+
+    def test_optimize_mean(self):
+        robust_objective = robust.RobustObjective(
+            VectorizedBeam(), self.prefs, self.tolerances, samples=200)
+        result = scipy.optimize.minimize(robust_objective, self.x,
+                                         method='Nelder-Mead',
+                                         options={'maxiter': 200})
+        self.assertLess(result.fun, robust_objective(self.x))
+
+    def test_unknown_statistic(self):
+        with self.assertRaises(ValueError):
+            robust.RobustObjective(VectorizedBeam(), self.prefs,
+                                   self.tolerances, statistic='median')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,11 @@ import unittest
 from collections import namedtuple
 import math
 import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
 
 from physprog import classfunctions
 from physprog import optimize
@@ -20,6 +25,26 @@ class TestInput(unittest.TestCase):
         functions = classfunctions.from_input(SAMPLE_INPUT)
         self.assertTrue('frequency' in functions)
 
+    def test_cached_class_functions(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            built = classfunctions.from_input(SAMPLE_INPUT, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            with mock.patch.object(classfunctions, 'build_all_splines') as b:
+                loaded = classfunctions.from_input(SAMPLE_INPUT, cache_dir)
+                b.assert_not_called()
+        finally:
+            shutil.rmtree(cache_dir)
+        self.assertEqual(list(loaded), list(built))
+        for name, func in built.items():
+            self.assertIs(type(loaded[name]), type(func))
+            self.assertEqual(loaded[name].bounds, func.bounds)
+        g = np.linspace(0, 3000, 301)
+        for name in ('frequency', 'cost', 'mass'):
+            self.assertEqual(loaded[name].beta, built[name].beta)
+            np.testing.assert_array_equal(loaded[name].evaluate_many(g),
+                                          built[name].evaluate_many(g))
+
 
 class Test_Sample_Problem(unittest.TestCase):
     """Test by optimizing a beam problem from the literature."""
@@ -0,0 +1,135 @@
+"""Unit tests for streaming design-of-experiments scoring."""
+# pylint: disable=invalid-name,missing-docstring
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import screening
+from physprog.tests.test_sample_problem import SAMPLE_INPUT
+
+NROWS = 1000
+
+
+class TestScoreFile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+        rng = np.random.RandomState(0)
+        cls.names = list(cls.prefs)
+        cls.data = np.empty((NROWS, len(cls.names)))
+        for i, func in enumerate(cls.prefs.values()):
+            if isinstance(func, classfunctions.SmoothClassFunction):
+                low, high = sorted((func.bounds[0], func.bounds[-1]))
+                spread = 0.1 * (high - low)
+                cls.data[:, i] = rng.uniform(low - spread, high + spread,
+                                             NROWS)
+            else:
+                cls.data[:, i] = rng.uniform(-0.01, 0.1, NROWS)
+        cls.data[3, 0] = np.nan  # an invalid design
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def expected(self):
+        """Score each row with the scalar class functions."""
+        totals = []
+        feasible = []
+        for row in self.data:
+            values = dict(zip(self.names, row))
+            if not np.all(np.isfinite(row)):
+                totals.append(1e3)
+            else:
+                totals.append(sum(
+                    func.evaluate(values[name])
+                    for name, func in self.prefs.items()
+                    if isinstance(func, classfunctions.SmoothClassFunction)))
+            feasible.append(all(
+                func.acceptability(values[name]) == 1.0
+                for name, func in self.prefs.items()
+                if isinstance(func, classfunctions.HardClassFunction)))
+        return np.array(totals), np.array(feasible)
+
+    def check(self, source, **kwargs):
+        output = os.path.join(self.tmpdir, 'scores.csv')
+        result = screening.score_file(source, self.prefs, output=output,
+                                      chunksize=64, top=5, **kwargs)
+        totals, feasible = self.expected()
+        self.assertEqual(result.rows, NROWS)
+        self.assertEqual(result.feasible, feasible.sum())
+
+        rows = np.flatnonzero(feasible)
+        best = rows[np.argsort(totals[rows], kind='stable')[:5]]
+        self.assertEqual([ranked.row for ranked in result.top], best.tolist())
+        np.testing.assert_allclose([ranked.value for ranked in result.top],
+                                   totals[best])
+
+        scores = np.genfromtxt(output, delimiter=',', names=True)
+        self.assertEqual(len(scores), NROWS)
+        np.testing.assert_array_equal(scores['row'], np.arange(NROWS))
+        np.testing.assert_allclose(scores['objective'], totals)
+        np.testing.assert_array_equal(scores['feasible'], feasible)
+        self.assertEqual(scores['cost_region'][0],
+                         self.prefs['cost'].which_region(self.data[0, 1]))
+
+    def test_structured_npy(self):
+        source = os.path.join(self.tmpdir, 'doe.npy')
+        structured = np.empty(NROWS, dtype=[(name, float)
+                                            for name in self.names])
+        for i, name in enumerate(self.names):
+            structured[name] = self.data[:, i]
+        np.save(source, structured)
+        self.check(source)
+
+    def test_plain_npy(self):
+        source = os.path.join(self.tmpdir, 'doe.npy')
+        # extra design variable column is ignored
+        np.save(source, np.column_stack([self.data, np.arange(NROWS)]))
+        self.check(source, columns=self.names + ['x0'])
+        with self.assertRaises(ValueError):
+            screening.score_file(source, self.prefs, columns=self.names)
+
+    def test_column_directory(self):
+        for i, name in enumerate(self.names):
+            np.save(os.path.join(self.tmpdir, name + '.npy'), self.data[:, i])
+        self.check(self.tmpdir)
+
+    def test_csv(self):
+        source = os.path.join(self.tmpdir, 'doe.csv')
+        np.savetxt(source, self.data, delimiter=',', fmt='%.17g',
+                   header=','.join(self.names), comments='')
+        self.check(source)
+
+    def test_csv_other_columns(self):
+        source = os.path.join(self.tmpdir, 'doe.csv')
+        with open(source, 'w') as out:
+            out.write(','.join(['id'] + self.names + ['note']) + '\n')
+            for i, row in enumerate(self.data):
+                out.write(','.join(['design{}'.format(i)] +
+                                   ['{:.17g}'.format(value) for value in row] +
+                                   ['' if i % 2 else 'ok']) + '\n')
+        self.check(source)
+        # an empty cell in a used column is a missing value
+        with open(source, 'a') as out:
+            out.write(','.join(['extra'] + [''] * len(self.names) + ['']) +
+                      '\n')
+        result = screening.score_file(source, self.prefs)
+        self.assertEqual(result.rows, NROWS + 1)
+        self.assertEqual(result.feasible, self.expected()[1].sum())
+
+    def test_missing_column(self):
+        source = os.path.join(self.tmpdir, 'doe.npy')
+        np.save(source, self.data[:, 1:])
+        with self.assertRaises(ValueError):
+            screening.score_file(source, self.prefs, columns=self.names[1:])
+
+
+if __name__ == '__main__':
+    unittest.main()
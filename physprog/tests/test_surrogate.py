@@ -0,0 +1,61 @@
+"""Unit tests for surrogate-assisted optimization."""
+# pylint: disable=invalid-name,missing-docstring
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import objective
+from physprog import surrogate
+from physprog.tests.test_caching import CountingBeam
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestSurfaces(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.x = rng.uniform(size=(30, 3))
+        self.y = (1.0 + self.x[:, 0] - 2 * self.x[:, 1] * self.x[:, 2] +
+                  self.x[:, 2] ** 2)
+        self.test_x = rng.uniform(size=(5, 3))
+
+    def test_quadratic_is_exact_for_quadratics(self):
+        surface = surrogate.QuadraticSurface().fit(self.x, self.y)
+        expected = (1.0 + self.test_x[:, 0] -
+                    2 * self.test_x[:, 1] * self.test_x[:, 2] +
+                    self.test_x[:, 2] ** 2)
+        np.testing.assert_allclose(surface.predict(self.test_x), expected)
+
+    def test_rbf_interpolates(self):
+        surface = surrogate.RBFSurface().fit(self.x, self.y)
+        np.testing.assert_allclose(surface.predict(self.x), self.y,
+                                   atol=1e-8)
+
+
+class TestOptimizeSurrogate(unittest.TestCase):
+
+    def test_beam(self):
+        prefs = classfunctions.from_input(SAMPLE_INPUT)
+        beam = CountingBeam()
+        x0 = np.array(beam.design)
+        initial = objective.build_objective(SampleProblemBeam(), prefs)(x0)
+        bounds = np.array([0.9 * x0, 1.1 * x0]).T
+        bounds[3] = (0.3, 0.6)
+        bounds[4] = (3.5, 6.0)
+        result = surrogate.optimize_surrogate(beam, prefs, bounds,
+                                              max_evaluations=30, seed=0)
+        self.assertLessEqual(result.evaluations, 30)
+        self.assertEqual(beam.calls, result.evaluations)
+        self.assertEqual(len(result.values), result.evaluations)
+        self.assertTrue(result.feasible)
+        self.assertLess(result.value, initial / 2)
+        # the reported value is that of the true model
+        self.assertAlmostEqual(
+            objective.build_objective(SampleProblemBeam(), prefs)(
+                result.design), result.value)
+        np.testing.assert_array_equal(beam.design, result.design)
+
+
+if __name__ == '__main__':
+    unittest.main()
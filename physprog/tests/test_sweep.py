@@ -0,0 +1,103 @@
+"""Unit tests for sweeps over preference variants."""
+# pylint: disable=invalid-name,missing-docstring
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from physprog import classfunctions
+from physprog import optimize
+from physprog import sweep
+from physprog.tests.test_sample_problem import SampleProblemBeam, SAMPLE_INPUT
+
+
+class TestVariants(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def test_grid(self):
+        variants = sweep.grid(self.prefs, {'cost': [0.9, 1.0],
+                                           'mass': [1.0, 1.1, 1.2]})
+        self.assertEqual(len(variants), 6)
+        self.assertEqual(variants[5]['cost'],
+                         sweep.scale_bounds(self.prefs['cost'].bounds, 1.0))
+        self.assertAlmostEqual(variants[5]['mass'].horrible,
+                               1.2 * self.prefs['mass'].bounds.horrible)
+
+    def test_build_variant(self):
+        bounds = classfunctions.SoftBounds(500, 600, 700, 800, 900)
+        funcs = sweep.build_variant(self.prefs, {'cost': bounds})
+        self.assertEqual(funcs['cost'].bounds, bounds)
+        self.assertNotEqual(self.prefs['cost'].bounds, bounds)
+        # same as building the edited preferences from scratch
+        scratch = classfunctions.from_input(SAMPLE_INPUT)
+        scratch['cost'].bounds = bounds
+        classfunctions.build_all_splines(
+            [func for func in scratch.values()
+             if isinstance(func, classfunctions.SmoothClassFunction)])
+        for name, func in scratch.items():
+            if isinstance(func, classfunctions.SmoothClassFunction):
+                np.testing.assert_allclose(funcs[name].table.coeffs,
+                                           func.table.coeffs)
+
+    def test_pareto_front(self):
+        outcomes = [[1.0, 5.0], [2.0, 2.0], [3.0, 3.0], [5.0, 1.0],
+                    [2.0, 2.0]]
+        np.testing.assert_array_equal(sweep.pareto_front(outcomes),
+                                      [True, True, False, True, True])
+
+
+class TestSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prefs = classfunctions.from_input(SAMPLE_INPUT)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_sweep(self):
+        variants = sweep.grid(self.prefs, {'cost': [0.8, 1.0, 1.2],
+                                           'mass': [0.9, 1.1]})
+        output = os.path.join(self.tmpdir, 'sweep.jsonl')
+        beam = SampleProblemBeam()
+        result = sweep.sweep(beam, self.prefs, variants, max_workers=2,
+                             output=output)
+        self.assertEqual([point.index for point in result.points],
+                         list(range(6)))
+        with open(output) as lines:
+            records = [json.loads(line) for line in lines]
+        self.assertEqual(sorted(record['index'] for record in records),
+                         list(range(6)))
+        self.assertTrue(result.pareto)
+        self.assertTrue(set(result.pareto) <= set(range(6)))
+
+        # later points start from the optimum of another point
+        designs = {point.design for point in result.points}
+        warm = [point for point in result.points
+                if point.start != tuple(beam.design)]
+        self.assertEqual(len(warm), 4)
+        for point in warm:
+            self.assertIn(point.start, designs)
+
+        # each point matches an optimization of its variant from its start
+        point = result.points[-1]
+        funcs = sweep.build_variant(self.prefs, point.variant)
+        beam.design = point.start
+        optimize.optimize(beam, funcs)
+        self.assertAlmostEqual(point.dependents['cost'], beam.cost())
+        self.assertTrue(all(point.feasible for point in result.points))
+
+    def test_no_variants(self):
+        result = sweep.sweep(SampleProblemBeam(), self.prefs, [])
+        self.assertEqual(result, sweep.SweepResult([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()